@@ -1,12 +1,22 @@
-import requests
 import re
 import json
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transport import default_transport
+from profiling import profiler
 
-def get_uniprot(ids: list):
+# How many IDs one request may carry: UniProt takes them in the query string
+# (URL length, and one results page of at most 500), Ensembl POST /lookup/id
+# accepts up to 1000 IDs per body.
+CHUNK_SIZE = {"uniprot": 100, "ensembl": 1000}
+
+def get_uniprot(ids: list, session=None):
     accessions = ','.join(ids)
     endpoint = "https://rest.uniprot.org/uniprotkb/accessions"
-    http_function = requests.get
-    http_args = {'params': {'accessions': accessions}}
+    http_function = (session or default_transport()).get
+    http_args = {'params': {'accessions': accessions, 'size': len(ids)}}
     return http_function(endpoint, **http_args)
 
 def parse_response_uniprot(resp: dict):
@@ -22,13 +32,13 @@ def parse_response_uniprot(resp: dict):
 
     return output
 
-def get_ensembl(ids: list):
+def get_ensembl(ids: list, session=None):
     server = "https://rest.ensembl.org"
     ext = "/lookup/id"
     headers = {"Content-Type": "application/json", "Accept": "application/json"}
     x = {"ids": ids}
     y = json.dumps(x)
-    resp = requests.post(server + ext, headers=headers, data = y)
+    resp = (session or default_transport()).post(server + ext, headers=headers, data = y)
     return resp
 
 def parse_response_ensembl(resp: dict):
@@ -55,16 +65,90 @@ def parse_response_ensembl(resp: dict):
 
     return output
 
-def access_database(ids: list):
-    dbRegEx = {"uniprot":"[OPQ][0-9][A-Z0-9]{3}[0-9]|[A-NR-Z][0-9]([A-Z][A-Z0-9]{2}[0-9]){1,2}",
-               "ensembl":"ENS[A-Z]{,4}(E|FM|G|GT|P|R|T)[0-9]{11}|MGP_[A-Za-z0-9]*_[0-9]{11}"}
-    if re.fullmatch(dbRegEx["uniprot"], ids[0])!=None:
-        return parse_response_uniprot(get_uniprot(ids))
-    else:
-        if re.fullmatch(dbRegEx["ensembl"], ids[0])!=None:
-            return parse_response_ensembl(get_ensembl(ids))
+def chunked(ids: list, size: int):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def fetch_batched(ids: list, get_function, parse_function, chunk_size: int, max_workers=4, session=None):
+    '''
+    Splits ids into chunks of chunk_size and sends them concurrently over one pooled
+    session (the shared Transport by default), with at most max_workers requests in flight.
+    Parsed chunks are merged into a single output dict.
+    '''
+    session = session or default_transport()
+    output = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(lambda chunk: parse_function(get_function(chunk, session)),
+                           chunked(ids, chunk_size))
+        for result in results:
+            output.update(result)
+    return output
+
+# One alternation with a named group per database, so every ID is classified
+# with a single precompiled match
+DB_REGEX = re.compile("(?P<uniprot>[OPQ][0-9][A-Z0-9]{3}[0-9]|[A-NR-Z][0-9]([A-Z][A-Z0-9]{2}[0-9]){1,2})"
+                      "|(?P<ensembl>ENS[A-Z]{,4}(E|FM|G|GT|P|R|T)[0-9]{11}|MGP_[A-Za-z0-9]*_[0-9]{11})")
+
+DB_CLIENT = {"uniprot": (get_uniprot, parse_response_uniprot),
+             "ensembl": (get_ensembl, parse_response_ensembl)}
+
+def route_ids(ids: list):
+    '''
+    Splits ids by database in one pass.
+    Returns {db_name: [ids]} for the databases that got at least one ID and the list of unmatched IDs.
+    '''
+    routes = {}
+    unmatched = []
+    for id in ids:
+        match = DB_REGEX.fullmatch(id)
+        if match is None:
+            unmatched.append(id)
+        else:
+            routes.setdefault(match.lastgroup, []).append(id)
+    return routes, unmatched
+
+def lookup(db: str, ids: list, batch=False, max_workers=4, cache=None):
+    '''
+    Fetches records for ids from one database. With a ResponseCache only the cache misses reach the network.
+    '''
+    get_function, parse_function = DB_CLIENT[db]
+    output = cache.get_many(db, ids) if cache is not None else {}
+    missing = [id for id in ids if id not in output]
+    profiler.count("db.cache_hits", len(ids) - len(missing))
+    if not missing:
+        return output
+    with profiler.span(f"lookup.{db}", ids=len(missing)):
+        if batch:
+            fetched = fetch_batched(missing, get_function, parse_function, CHUNK_SIZE[db], max_workers)
+        else:
+            # sequential, but still within the per-request limits of CHUNK_SIZE
+            fetched = {}
+            for chunk in chunked(missing, CHUNK_SIZE[db]):
+                fetched.update(parse_function(get_function(chunk)))
+    if cache is not None:
+        cache.put_many(db, fetched)
+    output.update(fetched)
+    return output
+
+@profiler.timed("access_database")
+def access_database(ids: list, batch=False, max_workers=4, cache=None):
+    '''
+    Routes every ID to its database, queries the databases in parallel and merges the records.
+    Returns the merged records and the list of IDs that matched no database.
+    '''
+    routes, unmatched = route_ids(ids)
+    output = {}
+    if routes:
+        with ThreadPoolExecutor(max_workers=len(routes)) as pool:
+            results = pool.map(lambda db: lookup(db, routes[db], batch, max_workers, cache), routes)
+            for result in results:
+                output.update(result)
+    return output, unmatched
 
 if __name__ == "__main__":
     ids = ["ENSMUSG00000041147", "ENSG00000139618"]
     # ids = ['P11473', 'P13053']
-    print(access_database(ids))
\ No newline at end of file
+    output, unmatched = access_database(ids)
+    print(output)
+    if unmatched:
+        print("No database matched:", unmatched)
\ No newline at end of file
@@ -1,20 +1,134 @@
-import requests
-import re
 import json
 from Bio import SeqIO
+from Bio.Seq import Seq
+import contextlib
 import subprocess
+import os
 import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transport import default_transport
+from profiling import profiler
+from concurrent.futures import ProcessPoolExecutor
+from fasta_stats import FastaStats, guess_type
+from fasta_index import FastaIndex
+import id_extraction
+
+
 class BioPythonLib:
-    def __init__(self, file_name):
-        self.regex = {"Protein": "^.*([OPQ][0-9][A-Z0-9]{3}[0-9]|[A-NR-Z][0-9]([A-Z][A-Z0-9]{2}[0-9]){1,2}).*$",
-                      "DNA": "^.*(ENS[A-Z]{0,4}|MGP_[A-Za-z0-9]{0,10}_)(E|FM|G|GT|P|R|T)(\d{11}).*$"}
+    '''
+    Fasta file analysis: statistics, IDs, records and database results.
+
+    Nothing is computed in the constructor. Every result is computed on first access and kept on the instance:
+      stats: seqkit-style statistics (in-process, or by running seqkit with use_seqkit=True)
+      ids: database IDs of the records (with a process pool if processes is set)
+      records: {"seq_id_<id>_info": {"description", "sequence"}}
+      db_result: (database name, records fetched from it)
+      output: everything above in one dict, as printed by run() without a writer
+
+    session and pool let several instances share one HTTP session (the shared Transport by default)
+    and one ProcessPoolExecutor, see process_many.
+    '''
+
+    # UniProt returns at most 500 records per page, Ensembl POST /lookup/id takes at most 1000 IDs
+    MAX_IDS_PER_REQUEST = {"uniprot": 500, "ensembl": 1000}
+
+    def __init__(self, file_name, cache=None, use_seqkit=False, processes=None, session=None, pool=None):
+        self.regex = id_extraction.ID_REGEX
         self.filename = file_name
-        self.SeqIO_ids = []
-        self.output = {"seqkit_result": self.seqkit_stats()}
-        self.biopython_parser()
-        self.access_database()
-        self.show_output(self.output)
+        self.cache = cache  # optional ResponseCache shared between runs
+        self.use_seqkit = use_seqkit
+        self.processes = processes
+        self.session = session
+        self.pool = pool
+        self.index = None  # FastaIndex, built on the first get_sequence call
+        self.fasta_stats = None  # FastaStats collected by the last full pass over the file
+        self.unmatched = []  # descriptions of records without an ID match
+        self.seqkit_result = None
+        self._fasta_type = None
+        self._ids = None
+        self._records = None
+        self._db_result = None
+
+    @classmethod
+    def process_many(cls, paths, processes=None, **kwargs):
+        '''
+        Yields (path, output) for every fasta file, reusing one HTTP session and, with processes, one worker pool
+        '''
+        session = default_transport()
+        with ProcessPoolExecutor(processes) if processes else contextlib.nullcontext() as pool:
+            for path in paths:
+                bio = cls(path, processes=processes, session=session, pool=pool, **kwargs)
+                yield path, bio.output
+
+    def run(self, writer=None):
+        '''
+        Computes everything and prints it. With a writer (one of the output_writers or any callable)
+        the records are streamed to it instead of being printed, see stream; returns their number then.
+        '''
+        if writer is not None:
+            return self.stream(writer)
+        output = self.output
+        self.show_output(output)
+        return output
+
+    @property
+    def stats(self):
+        if self.seqkit_result is None or "fasta_seqkit_stat_info" not in self.seqkit_result:
+            if self.use_seqkit:
+                self.seqkit_stats()
+            else:
+                if self.fasta_stats is None:
+                    self.ids  # statistics are collected while parsing
+                self.native_stats()
+        return self.seqkit_result
+
+    @property
+    def fasta_type(self):
+        if self._fasta_type is None:
+            if self.use_seqkit:
+                self._fasta_type = self.stats["fasta_type"]
+            else:
+                self._fasta_type = guess_type(self.filename)
+        return self._fasta_type
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            if self.processes is None:
+                self.biopython_parser()
+            else:
+                self.parallel_parser()
+        return self._ids
 
+    @property
+    def records(self):
+        if self._records is None:
+            if self.processes is None:
+                self.biopython_parser()
+            else:
+                self.parallel_parser(keep_records=True)
+        return self._records
+
+    @property
+    def db_result(self):
+        if self._db_result is None:
+            self._db_result = self.lookup_ids(self.ids)
+        return self._db_result
+
+    @property
+    def output(self):
+        records = self.records  # first: the same pass yields the IDs and the statistics
+        output = {"seqkit_result": self.stats}
+        output.update(records)
+        db_name, data = self.db_result
+        if db_name is not None:
+            output["DB_name"] = db_name
+            output["DB_result"] = data
+        if self.unmatched:
+            output["unmatched_records"] = self.unmatched
+        return output
+
+    @profiler.timed("fasta.seqkit_stats")
     def seqkit_stats(self):
         seqkit = subprocess.run(("seqkit", "stats", self.filename, "-a"),
                                 capture_output=True,
@@ -45,38 +159,124 @@ class BioPythonLib:
 
         return self.seqkit_result
 
-    def biopython_parser(self):
-        sequences = SeqIO.parse(self.filename, 'fasta')  # seq input; returns an iterator
-        regex = self.regex[self.seqkit_result["fasta_type"]]
+    def native_stats(self):
+        seq_result = self.fasta_stats.result()
+        self.seqkit_result = {"fasta_seqkit_stat_info": seq_result,
+                              "fasta_type": seq_result['type'],
+                              "fasta_num_seqs": seq_result['num_seqs'],
+                              }
 
-        for seq in sequences:
+        return self.seqkit_result
 
-            seq_description = seq.description
-            seq_sequence = seq.seq
+    def extract_id(self, seq_description):
+        return id_extraction.extract_id(self.fasta_type, seq_description)
 
-            # seq_id
-            match = re.fullmatch(regex, seq_description)
+    def iter_records(self):
+        '''
+        Yields (seq_id, record) pairs one at a time from the fasta file.
+        Records without an ID match are skipped and reported in self.unmatched.
+        Statistics are collected along the way unless they are already known.
+        '''
+        stats = FastaStats() if self.fasta_stats is None and not self.use_seqkit else None
+        unmatched = []
+        count = 0
+        for seq in SeqIO.parse(self.filename, 'fasta'):
+            count += 1
+            if stats is not None:
+                stats.add(bytes(seq.seq))
+            seq_id = self.extract_id(seq.description)
+            if seq_id is None:
+                unmatched.append(seq.description)
+                continue
+            yield seq_id, seq
+        self.unmatched = unmatched
+        profiler.count("fasta.records", count)
+        if stats is not None:
+            self.fasta_stats = stats
 
-            if match:
-                if self.seqkit_result["fasta_type"] == 'DNA':
-                    id_chunks = re.findall(regex, seq_description)
-                    seq_id = [''.join(chunk) for chunk in id_chunks][0]
+    @profiler.timed("fasta.biopython_parser")
+    def biopython_parser(self):
+        profiler.count("fasta.bytes", os.path.getsize(self.filename))
+        ids = []
+        records = {}
+        for seq_id, seq in self.iter_records():
+            ids.append(seq_id)
+            records[f'seq_id_{seq_id}_info'] = {"description": seq.description, "sequence": seq.seq}
+        self._ids = ids
+        self._records = records
 
-                if self.seqkit_result["fasta_type"] == 'Protein':
-                    seq_id = re.findall(regex, seq_description)[0][0]
+    @profiler.timed("fasta.parallel_parser")
+    def parallel_parser(self, keep_records=False):
+        '''
+        Extracts IDs (and statistics) with a process pool; sequences are only kept with keep_records,
+        otherwise use get_sequence for them
+        '''
+        profiler.count("fasta.bytes", os.path.getsize(self.filename))
+        ids, unmatched, stats, records = id_extraction.extract_ids(self.filename, self.fasta_type, self.processes,
+                                                                   self.pool, keep_records)
+        self._ids = ids
+        if keep_records:
+            self._records = {f'seq_id_{seq_id}_info': {"description": description, "sequence": Seq(sequence)}
+                             for seq_id, (description, sequence) in zip(ids, records)}
+        self.unmatched = unmatched
+        if not self.use_seqkit:
+            self.fasta_stats = stats
 
-                self.SeqIO_ids.append(seq_id)
-                self.output[f'seq_id_{seq_id}_info'] = {"description": seq_description, "sequence": seq_sequence}
+    @staticmethod
+    def iter_batches(items, batch_size):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
-            else:
-                print("No ID match found.")
-                sys.exit(1)
+    def iter_results(self, batch_size=500, inline_sequences=True):
+        '''
+        Generator pipeline: parse record -> extract ID -> group into batches -> look up in the database.
+        Only one batch of records is held in memory at a time.
+        With inline_sequences=False the sequence is replaced by a "<fasta file>:<record name>" reference
+        that get_sequence / FastaIndex can resolve.
+        '''
+        for batch in self.iter_batches(self.iter_records(), batch_size):
+            db_name, data = self.lookup_ids([seq_id for seq_id, _ in batch])
+            for seq_id, seq in batch:
+                result = {"id": seq_id, "description": seq.description}
+                if inline_sequences:
+                    result["sequence"] = str(seq.seq)
+                else:
+                    result["sequence_ref"] = f"{self.filename}:{seq.id}"
+                    result["length"] = len(seq)
+                result["DB_name"] = db_name
+                result["DB_result"] = data.get(seq_id)
+                yield result
+
+    def stream(self, sink, batch_size=500, inline_sequences=True):
+        '''
+        Sends every result of iter_results to sink: one of the output_writers (JsonLinesWriter, TsvWriter,
+        ParquetWriter, ArrowWriter) or any callable. Returns the number of processed records.
+        '''
+        count = 0
+        for result in self.iter_results(batch_size, inline_sequences):
+            sink(result)
+            count += 1
+        return count
+
+    def get_sequence(self, name, start=0, end=None):
+        '''
+        Random access to one record (by the first word of its header) through the memory-mapped .fai index
+        '''
+        if self.index is None:
+            self.index = FastaIndex(self.filename)
+        return self.index.get_sequence(name, start, end)
 
     def get_uniprot(self, ids: list):
         accessions = ','.join(ids)
         endpoint = "https://rest.uniprot.org/uniprotkb/accessions"
-        http_function = requests.get
-        http_args = {'params': {'accessions': accessions}}
+        http_function = (self.session or default_transport()).get
+        http_args = {'params': {'accessions': accessions, 'size': len(ids)}}
 
         return http_function(endpoint, **http_args)
 
@@ -86,7 +286,7 @@ class BioPythonLib:
         headers = {"Content-Type": "application/json"}
         x = {"ids": ids}
         y = json.dumps(x)
-        resp = requests.post(server + ext, headers=headers, data=y)
+        resp = (self.session or default_transport()).post(server + ext, headers=headers, data=y)
         return resp
 
     def parse_response_uniprot(self, resp: dict):
@@ -126,16 +326,30 @@ class BioPythonLib:
 
         return output
 
+    def cached_lookup(self, db, ids, get_function, parse_function):
+        '''
+        Looks up the IDs that are not cached, at most MAX_IDS_PER_REQUEST[db] per request
+        '''
+        data = self.cache.get_many(db, ids) if self.cache is not None else {}
+        missing = [id for id in ids if id not in data]
+        profiler.count("db.cache_hits", len(ids) - len(missing))
+        for batch in self.iter_batches(missing, self.MAX_IDS_PER_REQUEST[db]):
+            fetched = parse_function(get_function(batch))
+            if self.cache is not None:
+                self.cache.put_many(db, fetched)
+            data.update(fetched)
+        return data
+
+    @profiler.timed("access_database")
+    def lookup_ids(self, ids):
+        if self.fasta_type == 'Protein':
+            return "uniprot", self.cached_lookup("uniprot", ids, self.get_uniprot, self.parse_response_uniprot)
+        elif self.fasta_type == 'DNA':
+            return "ENSEMBL", self.cached_lookup("ensembl", ids, self.get_ensembl, self.parse_response_ensembl)
+        return None, {}
+
     def access_database(self):
-        ids = self.SeqIO_ids
-        if self.seqkit_result["fasta_type"] == 'Protein':
-            data = self.parse_response_uniprot(self.get_uniprot(ids))
-            self.output["DB_name"] = "uniprot"
-            self.output["DB_result"] = data
-        elif self.seqkit_result["fasta_type"] == 'DNA':
-            data = self.parse_response_ensembl(self.get_ensembl(ids))
-            self.output["DB_name"] = "ENSEMBL"
-            self.output["DB_result"] = data
+        return self.db_result
 
     def show_output(self, v, indent=0):
         for key, value in v.items():
@@ -0,0 +1,169 @@
+import mmap
+import os
+
+
+class FastaIndex:
+    '''
+    Random access to records of a fasta file through a samtools-style .fai sidecar and a memory map.
+
+    Records are keyed by the first word of their header. Every record has to use one line length
+    (except for its last line), as required by the .fai format.
+
+    Constructor params:
+      filename: fasta file
+      index_name: sidecar file, "<filename>.fai" by default
+
+    The sidecar is reused while it is newer than the fasta file. When the fasta file changes,
+    entries whose headers are still in place are kept and only the rest of the file is rescanned,
+    so appending records does not reindex the whole file.
+    get_sequence checks the file's size, mtime and inode on every call and remaps and reindexes it
+    when they changed, so a long-lived index follows a file that is appended to, rewritten or truncated.
+    '''
+
+    def __init__(self, filename, index_name=None):
+        self.filename = filename
+        self.index_name = index_name or filename + ".fai"
+        self.entries = {}  # name -> (length, offset, line_bases, line_width)
+        self._file = None
+        self._map = b''
+        self.open()
+        self.load()
+
+    @staticmethod
+    def stamp(stat):
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def open(self):
+        '''
+        (Re)opens and maps the fasta file, remembering its size, mtime and inode
+        '''
+        self.close()
+        self._file = open(self.filename, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._stamp = self.stamp(stat)
+        if stat.st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = b''
+
+    def refresh(self):
+        '''
+        Remaps the file and updates the index if the file changed since it was mapped
+        '''
+        if self.stamp(os.stat(self.filename)) == self._stamp:
+            return False
+        self.open()
+        self.scan(self.resume_offset())
+        self.save()
+        return True
+
+    def load(self):
+        if os.path.exists(self.index_name):
+            self.entries = self.read_index()
+            if os.path.getmtime(self.index_name) >= os.path.getmtime(self.filename):
+                return
+        self.scan(self.resume_offset())
+        self.save()
+
+    def read_index(self):
+        entries = {}
+        with open(self.index_name) as index:
+            for line in index:
+                name, length, offset, line_bases, line_width = line.rstrip('\n').split('\t')[:5]
+                entries[name] = (int(length), int(offset), int(line_bases), int(line_width))
+        return entries
+
+    def save(self):
+        temp_name = self.index_name + ".tmp"
+        with open(temp_name, 'w') as index:
+            for name, entry in self.entries.items():
+                index.write('\t'.join(map(str, (name, *entry))) + '\n')
+        os.replace(temp_name, self.index_name)
+
+    def header_start(self, name, offset):
+        '''
+        Start of the header line in front of offset, or None if that header does not belong to name
+        '''
+        if offset > len(self._map) or offset < 1:
+            return None
+        start = self._map.rfind(b'\n', 0, offset - 1) + 1
+        header = self._map[start:offset - 1].rstrip(b'\r')
+        if header[:1] != b'>' or header[1:].split(None, 1)[:1] != [name.encode()]:
+            return None
+        return start
+
+    def resume_offset(self):
+        '''
+        Checks the loaded entries against the current file and returns where scanning has to resume.
+        The last record is always rescanned because it may have grown.
+        '''
+        if not self.entries:
+            return 0
+        starts = [self.header_start(name, entry[1]) for name, entry in self.entries.items()]
+        if None in starts:
+            self.entries = {}
+            return 0
+        self.entries.popitem()
+        return starts[-1]
+
+    def scan(self, position):
+        mm = self._map
+        size = len(mm)
+        while position < size:
+            header_end = mm.find(b'\n', position)
+            if header_end == -1:
+                header_end = size
+            if mm[position:position + 1] != b'>':
+                raise ValueError(f"{self.filename}: expected a fasta header at byte {position}")
+            name = (mm[position + 1:header_end].split(None, 1) or [b''])[0].decode()
+
+            seq_start = header_end + 1
+            next_header = mm.find(b'\n>', header_end)
+            seq_end = size if next_header == -1 else next_header + 1
+
+            lines = mm[seq_start:seq_end].split(b'\n')
+            if lines and lines[-1] == b'':
+                lines.pop()
+            bases = [len(line.rstrip(b'\r')) for line in lines]
+            line_bases = bases[0] if bases else 0
+            line_width = len(lines[0]) + 1 if lines else 0
+            if any(len(line) + 1 != line_width for line in lines[:-1]) or (bases and bases[-1] > line_bases):
+                raise ValueError(f"{self.filename}: record {name} has lines of different length")
+
+            self.entries[name] = (sum(bases), seq_start, line_bases, line_width)
+            position = seq_end
+
+    def get_sequence(self, name, start=0, end=None):
+        '''
+        Returns the sequence of record name, or its [start, end) slice, without reading other records
+        '''
+        self.refresh()
+        length, offset, line_bases, line_width = self.entries[name]
+        start = max(start, 0)
+        end = length if end is None else min(end, length)
+        if start >= end:
+            return ''
+        first = offset + (start // line_bases) * line_width + start % line_bases
+        last = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases + 1
+        return self._map[first:last].replace(b'\n', b'').replace(b'\r', b'').decode()
+
+    def __contains__(self, name):
+        self.refresh()
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = b''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,143 @@
+from array import array
+
+import numpy as np
+
+# IUPAC letters (with ambiguity codes) as seqkit uses them for guessing the alphabet
+DNA_LETTERS = b"ACGTRYMKSWHBVDNacgtrymkswhbvdn"
+RNA_LETTERS = b"ACGURYMKSWHBVDNacgurymkswhbvdn"
+GAP_LETTERS = b"-. "
+GC_LETTERS = b"GCSgcs"
+
+
+def _mask(letters: bytes):
+    mask = np.zeros(256, dtype=bool)
+    mask[np.frombuffer(letters, dtype=np.uint8)] = True
+    return mask
+
+
+DNA_MASK = _mask(DNA_LETTERS + GAP_LETTERS)
+RNA_MASK = _mask(RNA_LETTERS + GAP_LETTERS)
+GAP_MASK = _mask(GAP_LETTERS)
+GC_MASK = _mask(GC_LETTERS)
+
+
+def guess_alphabet(counts: np.ndarray):
+    '''
+    Guesses the sequence type from byte counts the same way seqkit does: DNA, then RNA, otherwise Protein
+    '''
+    present = counts > 0
+    if not present[~DNA_MASK].any():
+        return "DNA"
+    if not present[~RNA_MASK].any():
+        return "RNA"
+    return "Protein"
+
+
+def guess_type(filename, limit=10000):
+    '''
+    Guesses the sequence type of a fasta file from the first limit bytes of its first record.
+    Returns None for a file without records.
+    '''
+    sequence = []
+    size = 0
+    in_record = False
+    with open(filename, 'rb') as fasta:
+        for line in fasta:
+            if line.startswith(b'>'):
+                if in_record:
+                    break
+                in_record = True
+            elif in_record:
+                sequence.append(line.strip())
+                size += len(sequence[-1])
+                if size >= limit:
+                    break
+    if not in_record:
+        return None
+    return guess_alphabet(np.bincount(np.frombuffer(b''.join(sequence), dtype=np.uint8), minlength=256))
+
+
+def median(values: np.ndarray):
+    n = len(values)
+    if n == 0:
+        return 0.0
+    if n % 2:
+        return float(values[n // 2])
+    return float(values[n // 2 - 1] + values[n // 2]) / 2
+
+
+def quartiles(lengths: np.ndarray):
+    '''
+    Q1, Q2, Q3 of sorted lengths: Q2 is the median, Q1 and Q3 are the medians of the lower and upper halves
+    '''
+    n = len(lengths)
+    if n == 0:
+        return 0.0, 0.0, 0.0
+    if n == 1:
+        return (float(lengths[0]),) * 3
+    half = n // 2
+    upper = lengths[half:] if n % 2 == 0 else lengths[half + 1:]
+    return median(lengths[:half]), median(lengths), median(upper)
+
+
+def n50(lengths: np.ndarray):
+    '''
+    N50 of sorted lengths
+    '''
+    if len(lengths) == 0:
+        return 0
+    descending = lengths[::-1]
+    cumulative = np.cumsum(descending)
+    return int(descending[np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+
+class FastaStats:
+    '''
+    Single-pass replacement for `seqkit stats -a` on fasta input.
+
+    Feed every record's sequence to add() while parsing; result() returns the same fields seqkit reports.
+    The type is guessed from the first record, so it is known before the rest of the file is read.
+    '''
+
+    def __init__(self):
+        self.lengths = array('q')
+        self.counts = np.zeros(256, dtype=np.int64)
+        self.type = None
+
+    def add(self, sequence: bytes):
+        counts = np.bincount(np.frombuffer(sequence, dtype=np.uint8), minlength=256)
+        if self.type is None:
+            self.type = guess_alphabet(counts)
+        self.counts += counts
+        self.lengths.append(len(sequence))
+
+    def merge(self, other):
+        '''
+        Adds the records collected by another FastaStats, e.g. one per chunk of the file
+        '''
+        if self.type is None:
+            self.type = other.type
+        self.counts += other.counts
+        self.lengths.extend(other.lengths)
+
+    def result(self):
+        lengths = np.sort(np.frombuffer(self.lengths, dtype=np.int64))
+        num_seqs = len(lengths)
+        sum_len = int(lengths.sum())
+        q1, q2, q3 = quartiles(lengths)
+        gc = self.counts[GC_MASK].sum() / sum_len * 100 if sum_len else 0.0
+        return {"format": "FASTA",
+                "type": self.type,
+                "num_seqs": num_seqs,
+                "sum_len": sum_len,
+                "min_len": int(lengths[0]) if num_seqs else 0,
+                "avg_len": round(sum_len / num_seqs, 1) if num_seqs else 0.0,
+                "max_len": int(lengths[-1]) if num_seqs else 0,
+                "Q1": q1,
+                "Q2": q2,
+                "Q3": q3,
+                "sum_gap": int(self.counts[GAP_MASK].sum()),
+                "N50": n50(lengths),
+                "Q20(%)": 0.0,
+                "Q30(%)": 0.0,
+                "GC(%)": round(float(gc), 2)}
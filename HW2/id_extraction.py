@@ -0,0 +1,125 @@
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from fasta_stats import FastaStats, guess_type
+
+# No leading ".*": the description is scanned once instead of being backtracked over from its end
+ID_REGEX = {"Protein": re.compile(r"([OPQ][0-9][A-Z0-9]{3}[0-9]|[A-NR-Z][0-9]([A-Z][A-Z0-9]{2}[0-9]){1,2})"),
+            "DNA": re.compile(r"(ENS[A-Z]{0,4}|MGP_[A-Za-z0-9]{0,10}_)(E|FM|G|GT|P|R|T)(\d{11})")}
+
+
+def extract_id(fasta_type, description):
+    '''
+    Returns the database ID found in a fasta description or None
+    '''
+    # The last ID of the description wins, as with the former "^.*(ID).*$" patterns: an Ensembl cDNA header
+    # ">ENST... cdna ... gene:ENSG..." gives the gene ID
+    match = None
+    for match in ID_REGEX[fasta_type].finditer(description):
+        pass
+    if match is None:
+        return None
+    if fasta_type == 'DNA':
+        return ''.join(match.groups())
+    return match.group(1)
+
+
+def record_ranges(filename, parts):
+    '''
+    Splits the file into at most parts (start, end) byte ranges that begin at a record header
+    '''
+    size = os.path.getsize(filename)
+    if size == 0:
+        return []
+    boundaries = [0]
+    with open(filename, 'rb') as fasta, mmap.mmap(fasta.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for part in range(1, parts):
+            position = mm.find(b'\n>', max(size * part // parts, boundaries[-1]))
+            if position == -1:
+                break
+            boundaries.append(position + 1)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def extract_range(filename, fasta_type, start, end, keep_records=False):
+    '''
+    Worker: extracts IDs and collects statistics for the records whose headers lie in [start, end).
+    With keep_records the (description, sequence) of every record with an ID is returned too, else None.
+    '''
+    ids = []
+    unmatched = []
+    records = [] if keep_records else None
+    description = None
+    stats = FastaStats()
+    stats.type = fasta_type
+    sequence = None
+    with open(filename, 'rb') as fasta:
+        fasta.seek(start)
+        position = start
+        for line in fasta:
+            if position >= end:
+                break
+            position += len(line)
+            if line.startswith(b'>'):
+                if sequence is not None:
+                    finish_record(stats, records, description, sequence)
+                sequence = []
+                description = line[1:].rstrip().decode()
+                seq_id = extract_id(fasta_type, description)
+                if seq_id is None:
+                    unmatched.append(description)
+                    description = None
+                else:
+                    ids.append(seq_id)
+            elif sequence is not None:
+                sequence.append(line.strip())
+    if sequence is not None:
+        finish_record(stats, records, description, sequence)
+    return ids, unmatched, stats, records
+
+
+def finish_record(stats, records, description, sequence):
+    sequence = b''.join(sequence)
+    stats.add(sequence)
+    if records is not None and description is not None:
+        records.append((description, sequence.decode()))
+
+
+def extract_ids(filename, fasta_type=None, processes=None, pool=None, keep_records=False):
+    '''
+    Extracts the IDs of all records with a process pool working on record-aligned byte ranges.
+    An existing ProcessPoolExecutor can be passed as pool, otherwise one is created for this call.
+    Returns the IDs in file order, the descriptions without an ID match, the FastaStats of the file and,
+    with keep_records, the (description, sequence) pairs matching the IDs (None otherwise).
+    '''
+    fasta_type = fasta_type or guess_type(filename)
+    processes = processes or os.cpu_count()
+    ids = []
+    unmatched = []
+    records = [] if keep_records else None
+    stats = FastaStats()
+    stats.type = fasta_type
+    ranges = record_ranges(filename, processes * 4)
+    if not ranges:
+        return ids, unmatched, stats, records
+
+    starts, ends = zip(*ranges)
+    own_pool = pool is None
+    if own_pool:
+        pool = ProcessPoolExecutor(processes)
+    try:
+        for part_ids, part_unmatched, part_stats, part_records in pool.map(
+                extract_range, repeat(filename), repeat(fasta_type), starts, ends, repeat(keep_records)):
+            ids.extend(part_ids)
+            unmatched.extend(part_unmatched)
+            stats.merge(part_stats)
+            if keep_records:
+                records.extend(part_records)
+    finally:
+        if own_pool:
+            pool.shutdown()
+    return ids, unmatched, stats, records
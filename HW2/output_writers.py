@@ -0,0 +1,129 @@
+import csv
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def to_column(value):
+    '''
+    Nested values (database records) are stored as JSON text so every batch has the same columns
+    '''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+class BatchWriter:
+    '''
+    Base class for BioPythonLib.stream sinks.
+    Rows are collected and written batch_size at a time; use as a context manager or call close().
+    '''
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.rows = []
+
+    def __call__(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.write_batch(self.rows)
+            self.rows = []
+
+    def write_batch(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonLinesWriter(BatchWriter):
+    def __init__(self, path, batch_size=1000):
+        super().__init__(path, batch_size)
+        self.file = open(path, 'w')
+
+    def write_batch(self, rows):
+        self.file.write(''.join(json.dumps(row) + '\n' for row in rows))
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class TsvWriter(BatchWriter):
+    '''
+    Tab separated output with a header taken from the first row
+    '''
+
+    def __init__(self, path, batch_size=1000):
+        super().__init__(path, batch_size)
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file, delimiter='\t', lineterminator='\n')
+        self.columns = None
+
+    def write_batch(self, rows):
+        if self.columns is None:
+            self.columns = list(rows[0])
+            self.writer.writerow(self.columns)
+        self.writer.writerows([to_column(row.get(column)) for column in self.columns] for row in rows)
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ParquetWriter(BatchWriter):
+    '''
+    Parquet output through pyarrow, one row group per batch. The schema is fixed by the first row:
+    integer columns stay integers, everything else is stored as text.
+    '''
+
+    def __init__(self, path, batch_size=10000):
+        if pa is None:
+            raise ImportError("ParquetWriter needs pyarrow: pip install pyarrow")
+        super().__init__(path, batch_size)
+        self.schema = None
+        self.writer = None
+
+    def make_schema(self, row):
+        return pa.schema([(column, pa.int64() if isinstance(value, int) else pa.string())
+                          for column, value in row.items()])
+
+    def open_writer(self):
+        return pq.ParquetWriter(self.path, self.schema)
+
+    def write_batch(self, rows):
+        if self.schema is None:
+            self.schema = self.make_schema(rows[0])
+            self.writer = self.open_writer()
+        columns = {column: [to_column(row.get(column)) for row in rows] for column in self.schema.names}
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        super().close()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ArrowWriter(ParquetWriter):
+    '''
+    Arrow IPC file output, one record batch per batch
+    '''
+
+    def open_writer(self):
+        return pa.ipc.new_file(self.path, self.schema)
@@ -0,0 +1,87 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    '''
+    Persistent SQLite cache for parsed UniProt/Ensembl records.
+
+    Records are stored as JSON under (database name, accession) together with the time they were stored.
+
+    Constructor params:
+      path: SQLite file; ":memory:" keeps the cache for the current process only
+      ttl: seconds a record stays valid, None for no expiry
+      max_entries: upper bound on stored records, the oldest ones are evicted first
+
+    Counters:
+      hits, misses: how many accessions were found in / missing from the cache
+    '''
+
+    def __init__(self, path="db_cache.sqlite", ttl=7 * 24 * 3600, max_entries=1_000_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS records ("
+                                 "db TEXT NOT NULL, accession TEXT NOT NULL, "
+                                 "record TEXT NOT NULL, stored REAL NOT NULL, "
+                                 "PRIMARY KEY (db, accession))")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS records_stored ON records (stored)")
+        self._connection.commit()
+
+    def _oldest_valid(self):
+        if self.ttl is None:
+            return 0
+        return time.time() - self.ttl
+
+    def get_many(self, db: str, ids: list):
+        '''
+        Returns {accession: record} for the ids that have a valid cached record.
+        '''
+        found = {}
+        oldest = self._oldest_valid()
+        unique_ids = list(dict.fromkeys(ids))
+        with self._lock:
+            # SQLite limits the number of bound variables per statement
+            for start in range(0, len(unique_ids), 500):
+                chunk = unique_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT accession, record FROM records "
+                    f"WHERE db = ? AND stored >= ? AND accession IN ({placeholders})",
+                    (db, oldest, *chunk))
+                for accession, record in rows:
+                    found[accession] = json.loads(record)
+            self.hits += len(found)
+            self.misses += len(unique_ids) - len(found)
+        return found
+
+    def put_many(self, db: str, records: dict):
+        now = time.time()
+        rows = [(db, accession, json.dumps(record), now) for accession, record in records.items()]
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", rows)
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        if self.ttl is not None:
+            self._connection.execute("DELETE FROM records WHERE stored < ?", (self._oldest_valid(),))
+        count = self._connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        if count > self.max_entries:
+            self._connection.execute("DELETE FROM records WHERE rowid IN "
+                                     "(SELECT rowid FROM records ORDER BY stored LIMIT ?)",
+                                     (count - self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        self._connection.close()
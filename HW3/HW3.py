@@ -1,5 +1,7 @@
 import enum
-import openmeteo_requests
+import threading
+from collections import namedtuple
+from weather import weather_service
 
 class CarStatus(enum.Enum):
     ON_ROAD = 1
@@ -62,6 +64,35 @@ class DecreaseSpeed():
             self.current_speed = 0
             return self.current_speed
 
+def increase_speed(current_speed: int, max_speed: int, upper_border=None):
+    '''
+    Speed after IncreaseSpeed() is applied once or until upper_border is reached, computed in O(1)
+    '''
+    if upper_border is None:
+        return min(current_speed + 10, max_speed)
+    upper_border = min(upper_border, max_speed)
+    if current_speed >= upper_border:
+        return current_speed
+    steps = -(-(upper_border - current_speed) // 10)
+    return min(current_speed + 10 * steps, max_speed)
+
+
+def decrease_speed(current_speed: int, lower_border=None):
+    '''
+    Speed after DecreaseSpeed() is applied once or until lower_border is reached, computed in O(1)
+    '''
+    if lower_border is None:
+        return max(current_speed - 10, 0)
+    lower_border = max(lower_border, 0)
+    if current_speed <= lower_border:
+        return current_speed
+    steps = -(-(current_speed - lower_border) // 10)
+    return max(current_speed - 10 * steps, 0)
+
+
+# Entry of the Car event log
+SpeedEvent = namedtuple('SpeedEvent', ['car', 'action', 'from_speed', 'to_speed'])
+
 class Car():
     '''
     Car class.
@@ -71,6 +102,8 @@ class Car():
       max_speed: a maximum possible speed, km/h
       current_speed: current speed, km/h (0 by default)
       state: reflects if the Car is in the parking or on the road
+      verbose: print every step (True by default); with False speed changes are computed in O(1) without printing
+      events: optional list that gets a SpeedEvent for every accelerate/brake/parking call
 
     Methods:
       accelerate: increases the speed using IncreaseSpeed() iterator either once or gradually to the upper_border
@@ -79,22 +112,36 @@ class Car():
       total_cars: show the total amount of cars on the road
       show_weather: shows the current weather conditions
     '''
+    __slots__ = ('max_speed', 'current_speed', 'state', 'verbose', 'events')
     __car_ctr = 0
-    def __init__(self, max_speed: int, current_speed = 0):
+    __ctr_lock = threading.Lock()
+
+    @classmethod
+    def _count_car(cls, delta):
+        with cls.__ctr_lock:
+            cls.__car_ctr += delta
+
+    def __init__(self, max_speed: int, current_speed = 0, verbose=True, events=None):
         self.max_speed = max_speed
         self.current_speed = current_speed
+        self.verbose = verbose
+        self.events = events
         if current_speed <= 0:
             self.current_speed = 0
             self.state = CarStatus.PARKING
         else:
             self.state = CarStatus.ON_ROAD
-            Car.__car_ctr += 1
+            Car._count_car(1)
 
     def accelerate(self, upper_border=None):
         temp_speed = self.current_speed
         if (temp_speed == 0)&(self.state == CarStatus.PARKING):
             self.state = CarStatus.ON_ROAD
-            Car.__car_ctr += 1
+            Car._count_car(1)
+        if not self.verbose:
+            self.current_speed = increase_speed(self.current_speed, self.max_speed, upper_border)
+            self._log('accelerate', temp_speed)
+            return
         incr_iter = iter(IncreaseSpeed(self.current_speed, self.max_speed))
         if upper_border is None:
             try:
@@ -113,9 +160,14 @@ class Car():
                 except StopIteration:
                     break
             print(f"The speed of this car have been increased from {temp_speed} to {self.current_speed}")
+        self._log('accelerate', temp_speed)
 
     def brake(self, lower_border=None):
         temp_speed = self.current_speed
+        if not self.verbose:
+            self.current_speed = decrease_speed(self.current_speed, lower_border)
+            self._log('brake', temp_speed)
+            return
         decr_iter = iter(DecreaseSpeed(self.current_speed))
         if lower_border is None:
             try:
@@ -134,42 +186,36 @@ class Car():
                 except StopIteration:
                     break
             print(f"The speed of this car have been decreased from {temp_speed} to {self.current_speed}")
+        self._log('brake', temp_speed)
 
     def parking(self):
         self.brake(0)
         if self.state != CarStatus.PARKING:
             self.state = CarStatus.PARKING
-            Car.__car_ctr -= 1
-            print("Parking the car...")
-        else:
+            Car._count_car(-1)
+            self._log('parking', self.current_speed)
+            if self.verbose:
+                print("Parking the car...")
+        elif self.verbose:
             print("The car is already parked")
 
+    def _log(self, action, from_speed):
+        if self.events is not None:
+            self.events.append(SpeedEvent(self, action, from_speed, self.current_speed))
+
     @classmethod
     def total_cars(cls):
         print(cls.__car_ctr)
         return cls.__car_ctr
 
     @staticmethod
-    def show_weather():
-        openmeteo = openmeteo_requests.Client()
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": 59.9386,  # for St.Petersburg
-            "longitude": 30.3141,  # for St.Petersburg
-            "current_weather": True,
-            "timezone": "Europe/Moscow"
-        }
-        response = openmeteo.weather_api(url, params=params)[0]
-        current = response.Current()
-        current_temperature_2m = current.Variables(0).Value()
-        current_apparent_temperature = current.Variables(1).Value()
-        current_rain = current.Variables(2).Value()
-        current_wind_speed_10m = current.Variables(3).Value()
-
-        print(f"Current temperature: {round(current_temperature_2m, 0)} C")
-        print(f"Current apparent_temperature: {round(current_apparent_temperature, 0)} C")
-        print(f"Current rain: {current_rain} mm")
-        print(f"Current wind_speed: {round(current_wind_speed_10m, 1)} m/s")
+    def show_weather(latitude=59.9386, longitude=30.3141):  # St.Petersburg by default
+        current = weather_service().get(latitude, longitude)
+
+        print(f"Current temperature: {round(current['temperature_2m'], 0)} C")
+        print(f"Current apparent_temperature: {round(current['apparent_temperature'], 0)} C")
+        print(f"Current rain: {current['rain']} mm")
+        print(f"Current wind_speed: {round(current['wind_speed_10m'], 1)} m/s")
 
 
 if __name__ == "__main__":
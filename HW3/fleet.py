@@ -0,0 +1,93 @@
+import threading
+
+import numpy as np
+
+from HW3 import CarStatus
+
+
+class Fleet():
+    '''
+    Many cars simulated at once: speeds, max speeds and CarStatus values are kept in NumPy arrays
+    and every operation is applied to the whole fleet (or to the cars selected by `cars`) without Python loops.
+    Speed changes follow Car/IncreaseSpeed/DecreaseSpeed: steps of 10 km/h, never above max_speed or below 0.
+
+    Constructor params:
+      max_speeds: maximum possible speeds, km/h
+      current_speeds: current speeds, km/h (0 by default); cars with speed <= 0 start in the parking
+
+    Methods (cars: boolean mask or indices, all cars by default; a car listed twice is changed once):
+      accelerate: one step of 10 km/h, or steps up to upper_border (a number, an array with one value per car
+        of the fleet, or an array with one value per selected car in the order of cars)
+      brake: one step of 10 km/h down, or steps down to lower_border (given like upper_border)
+      parking: stops the cars and removes them from the road
+      total_cars: amount of cars on the road, O(1)
+    '''
+
+    def __init__(self, max_speeds, current_speeds=None):
+        self.max_speeds = np.asarray(max_speeds, dtype=np.int32)
+        if current_speeds is None:
+            self.speeds = np.zeros_like(self.max_speeds)
+        else:
+            self.speeds = np.maximum(np.asarray(current_speeds, dtype=np.int32), 0)
+        self.states = np.where(self.speeds > 0, CarStatus.ON_ROAD.value, CarStatus.PARKING.value).astype(np.int8)
+        self._lock = threading.Lock()
+        self._on_road = int(np.count_nonzero(self.states == CarStatus.ON_ROAD.value))
+
+    def __len__(self):
+        return len(self.speeds)
+
+    def _select(self, cars):
+        if cars is None:
+            return slice(None)
+        cars = np.arange(len(self))[cars]  # indices for masks and negative indices
+        _, first = np.unique(cars, return_index=True)
+        return cars[np.sort(first)]
+
+    def _border(self, border, cars):
+        border = np.asarray(border)
+        if border.ndim and len(border) == len(self) and not isinstance(cars, slice):
+            return border[cars]
+        return border
+
+    def accelerate(self, upper_border=None, cars=None):
+        cars = self._select(cars)
+        with self._lock:
+            speeds = self.speeds[cars]
+            states = self.states[cars]
+            max_speeds = self.max_speeds[cars]
+
+            parked = (speeds == 0) & (states == CarStatus.PARKING.value)
+            states[parked] = CarStatus.ON_ROAD.value
+            self._on_road += int(np.count_nonzero(parked))
+
+            if upper_border is None:
+                new_speeds = np.minimum(speeds + 10, max_speeds)
+            else:
+                target = np.minimum(self._border(upper_border, cars), max_speeds)
+                steps = np.maximum(-(-(target - speeds) // 10), 0)  # ceil((target - speed) / 10)
+                new_speeds = np.where(speeds < target, np.minimum(speeds + 10 * steps, max_speeds), speeds)
+            self.speeds[cars] = new_speeds
+            self.states[cars] = states
+
+    def brake(self, lower_border=None, cars=None):
+        cars = self._select(cars)
+        with self._lock:
+            speeds = self.speeds[cars]
+            if lower_border is None:
+                new_speeds = np.maximum(speeds - 10, 0)
+            else:
+                target = np.maximum(self._border(lower_border, cars), 0)
+                steps = np.maximum(-(-(speeds - target) // 10), 0)  # ceil((speed - target) / 10)
+                new_speeds = np.where(speeds > target, np.maximum(speeds - 10 * steps, 0), speeds)
+            self.speeds[cars] = new_speeds
+
+    def parking(self, cars=None):
+        cars = self._select(cars)
+        with self._lock:
+            on_road = self.states[cars] == CarStatus.ON_ROAD.value
+            self._on_road -= int(np.count_nonzero(on_road))
+            self.speeds[cars] = 0
+            self.states[cars] = CarStatus.PARKING.value
+
+    def total_cars(self):
+        return self._on_road
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import openmeteo_requests
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transport import default_transport
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+# requested explicitly, so Variables(i) of the response follow this order
+CURRENT_VARIABLES = ["temperature_2m", "apparent_temperature", "rain", "wind_speed_10m"]
+
+
+class WeatherService():
+    '''
+    Current weather for many locations with one reused Open-Meteo client.
+
+    Locations are snapped to grid cells of `grid` degrees; every cell is fetched at most once per `ttl` seconds
+    and up to `max_batch` cells go into one request (Open-Meteo accepts lists of coordinates).
+
+    Constructor params:
+      grid: cell size, degrees
+      ttl: how long a cell stays cached, seconds
+      max_batch: cells per request
+      batch_delay: how long get_async collects concurrent queries before sending them together, seconds
+      max_cells: cells kept in the cache at most; expired cells are dropped first
+      client: openmeteo_requests.Client, one over the shared transport by default
+
+    Methods:
+      get / get_many: weather dicts (CURRENT_VARIABLES -> value) for one or many (latitude, longitude) pairs
+      get_async / get_many_async: the same for asyncio code; concurrent queries are merged into batched requests
+    '''
+
+    def __init__(self, grid=0.1, ttl=600, max_batch=100, batch_delay=0.01, max_cells=100000, client=None):
+        self.grid = grid
+        self.ttl = ttl
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.max_cells = max_cells
+        self.client = client or openmeteo_requests.Client(session=default_transport())
+        self._cache = {}  # cell -> (fetch time, weather), oldest fetch first
+        self._lock = threading.Lock()
+        self._pending = {}  # cell -> future, for get_async
+        self._flush_scheduled = False
+        self._tasks = set()  # running _flush tasks; the loop keeps only weak references to tasks
+
+    def cell(self, latitude, longitude):
+        return round(latitude / self.grid), round(longitude / self.grid)
+
+    def _cached(self, cell):
+        with self._lock:
+            entry = self._cache.get(cell)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def _fetch_cells(self, cells):
+        '''
+        Fetches the cells in batches of max_batch and returns {cell: weather}
+        '''
+        results = {}
+        for start in range(0, len(cells), self.max_batch):
+            batch = cells[start:start + self.max_batch]
+            params = {"latitude": [row * self.grid for row, _ in batch],
+                      "longitude": [column * self.grid for _, column in batch],
+                      "current": CURRENT_VARIABLES}
+            responses = self.client.weather_api(FORECAST_URL, params=params)
+            now = time.monotonic()
+            for cell, response in zip(batch, responses):
+                current = response.Current()
+                weather = {name: current.Variables(i).Value() for i, name in enumerate(CURRENT_VARIABLES)}
+                results[cell] = weather
+                with self._lock:
+                    self._cache.pop(cell, None)  # re-insert, so the dict stays ordered by fetch time
+                    self._cache[cell] = (now, weather)
+                    self._evict(now)
+        return results
+
+    def _evict(self, now):
+        '''
+        Drops expired cells and, above max_cells, the oldest ones; called with the lock held
+        '''
+        while self._cache:
+            cell = next(iter(self._cache))
+            if now - self._cache[cell][0] <= self.ttl and len(self._cache) <= self.max_cells:
+                break
+            del self._cache[cell]
+
+    def get_many(self, locations):
+        cells = [self.cell(latitude, longitude) for latitude, longitude in locations]
+        found = {}
+        for cell in dict.fromkeys(cells):
+            weather = self._cached(cell)
+            if weather is not None:
+                found[cell] = weather
+        missing = [cell for cell in dict.fromkeys(cells) if cell not in found]
+        if missing:
+            found.update(self._fetch_cells(missing))
+        return [found[cell] for cell in cells]
+
+    def get(self, latitude, longitude):
+        return self.get_many([(latitude, longitude)])[0]
+
+    async def get_async(self, latitude, longitude):
+        cell = self.cell(latitude, longitude)
+        weather = self._cached(cell)
+        if weather is not None:
+            return weather
+        future = self._pending.get(cell)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[cell] = future
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                loop.call_later(self.batch_delay, self._start_flush, loop)
+        return await asyncio.shield(future)  # one cancelled caller must not cancel the others
+
+    def _start_flush(self, loop):
+        task = loop.create_task(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        self._flush_scheduled = False
+        loop = asyncio.get_running_loop()
+        results = None
+        error = None
+        try:
+            results = await loop.run_in_executor(None, self._fetch_cells, list(pending))
+        except Exception as exception:
+            error = exception
+        finally:
+            # every waiting get_async gets an answer, whatever happened (also when this task is cancelled)
+            for cell, future in pending.items():
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                elif results is None:
+                    future.cancel()
+                elif cell in results:
+                    future.set_result(results[cell])
+                else:
+                    future.set_exception(LookupError(f"no weather returned for cell {cell}"))
+
+    async def get_many_async(self, locations):
+        return await asyncio.gather(*(self.get_async(latitude, longitude) for latitude, longitude in locations))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def weather_service():
+    '''
+    Process-wide WeatherService
+    '''
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = WeatherService()
+        return _service
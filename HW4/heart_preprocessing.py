@@ -0,0 +1,132 @@
+'''
+Preprocessing of the heart failure dataset (heart.csv) from HW4, usable on extracts that do not fit in memory.
+
+  encode: maps the categorical columns to the codes used in the notebook, as Int8 (or category) columns
+  read_chunks: reads CSV or Parquet input chunk by chunk with compact nullable dtypes, already encoded
+  RunningStats: correlation matrix and per-class aggregates updated chunk by chunk
+  analyze: runs RunningStats over a whole file
+'''
+import numpy as np
+import pandas as pd
+
+# codes are the positions in these lists, the same as in the notebook's replace() calls
+CATEGORIES = {'Sex': ['M', 'F'],
+              'ChestPainType': ['ATA', 'NAP', 'ASY', 'TA'],
+              'RestingECG': ['Normal', 'ST', 'LVH'],
+              'ExerciseAngina': ['N', 'Y'],
+              'ST_Slope': ['Up', 'Flat', 'Down']}
+
+# nullable integers: extracts may have gaps
+NUMERIC_DTYPES = {'Age': 'Int16',
+                  'RestingBP': 'Int16',
+                  'Cholesterol': 'Int16',
+                  'FastingBS': 'Int8',
+                  'MaxHR': 'Int16',
+                  'Oldpeak': 'float32',
+                  'HeartDisease': 'Int8'}
+
+TARGET = 'HeartDisease'
+
+
+def encode(data: pd.DataFrame, as_category=False):
+    '''
+    Replaces the categorical columns with their codes (nullable Int8, <NA> for missing and unknown values) or,
+    with as_category=True, with pandas categoricals of the fixed schema
+    '''
+    data = data.copy()
+    for column, categories in CATEGORIES.items():
+        if column not in data.columns:
+            continue
+        values = pd.Categorical(data[column], categories=categories)
+        if as_category:
+            data[column] = values
+        else:
+            codes = pd.array(values.codes, dtype='Int8')
+            codes[values.codes == -1] = pd.NA
+            data[column] = codes
+    return data
+
+
+def read_chunks(path, chunksize=100000, as_category=False):
+    '''
+    Yields encoded DataFrames of at most chunksize rows from a .csv or .parquet file
+    '''
+    if str(path).endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            chunk = batch.to_pandas()
+            yield encode(chunk.astype({column: dtype for column, dtype in NUMERIC_DTYPES.items()
+                                       if column in chunk.columns}), as_category)
+    else:
+        dtypes = dict(NUMERIC_DTYPES)
+        dtypes.update({column: 'category' for column in CATEGORIES})
+        for chunk in pd.read_csv(path, dtype=dtypes, chunksize=chunksize):
+            yield encode(chunk, as_category)
+
+
+class RunningStats:
+    '''
+    Pearson correlation of all columns and per-class aggregates (count, mean, std), updated chunk by chunk
+    from running sums, so the result equals data.corr() / data.groupby(TARGET).agg(...) on the whole data.
+    Rows with missing values are left out.
+    '''
+
+    def __init__(self, target=TARGET):
+        self.target = target
+        self.columns = None
+        self.n = 0
+        self.sums = None
+        self.products = None
+        self.class_stats = {}  # class -> [count, sums, sums of squares]
+
+    def update(self, chunk: pd.DataFrame):
+        # unknown categories (-1 codes of older encodings) count as missing
+        chunk = chunk.replace({column: {-1: np.nan} for column in CATEGORIES if column in chunk.columns}).dropna()
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.sums = np.zeros(len(self.columns))
+            self.products = np.zeros((len(self.columns), len(self.columns)))
+        values = chunk[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.n += len(values)
+        self.sums += values.sum(axis=0)
+        self.products += values.T @ values
+
+        labels = chunk[self.target].to_numpy(dtype=np.int64)
+        for label in np.unique(labels):
+            rows = values[labels == label]
+            stats = self.class_stats.setdefault(label, [0, np.zeros(len(self.columns)), np.zeros(len(self.columns))])
+            stats[0] += len(rows)
+            stats[1] += rows.sum(axis=0)
+            stats[2] += (rows ** 2).sum(axis=0)
+
+    def corr(self):
+        mean = self.sums / self.n
+        covariance = self.products / self.n - np.outer(mean, mean)
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(std, std)
+        return pd.DataFrame(correlation, index=self.columns, columns=self.columns)
+
+    def class_summary(self):
+        '''
+        DataFrame indexed by class with (column, count / mean / std) columns; std is the sample std as in pandas
+        '''
+        frames = {}
+        for label, (count, sums, squares) in sorted(self.class_stats.items()):
+            mean = sums / count
+            variance = (squares - count * mean ** 2) / (count - 1) if count > 1 else np.full(len(mean), np.nan)
+            frames[label] = pd.DataFrame({'count': count, 'mean': mean, 'std': np.sqrt(np.maximum(variance, 0))},
+                                         index=self.columns).stack()
+        summary = pd.DataFrame(frames).T
+        summary.index.name = self.target
+        return summary
+
+
+def analyze(path, chunksize=100000):
+    '''
+    Returns RunningStats over the whole file, reading it chunksize rows at a time
+    '''
+    stats = RunningStats()
+    for chunk in read_chunks(path, chunksize):
+        stats.update(chunk)
+    return stats
@@ -4,8 +4,18 @@ IMPORT PART
 from sklearn.model_selection import train_test_split
 from sklearn.impute import SimpleImputer as Imputer
 import numpy as np
-import urllib.request
-import json
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import joblib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from joblib import Memory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transport import default_transport
+from profiling import profiler
 
 # copy the function of your choice from regression.py and the necessary imports for it -> it will perform hyperparameters tuning on selected regression model
 # find and import the corresponding model from sklearn
@@ -20,24 +30,101 @@ from sklearn.linear_model import ElasticNetCV
 from sklearn.pipeline import Pipeline
 
 from molecular_descriptors import *
+from descriptor_store import DescriptorStore, canonical_smiles
+from descriptor_engine import get_descriptors_parallel
+from similarity_index import SimilarityIndex
 
 '''
 DESCRIPTORS PART
 '''
-def fit_ElasticNet(X_train, X_test, y_train, y_test):
+def mutual_info_scores(X, y):
+    # fixed random_state: cached scores have to be reproducible
+    return mutual_info_regression(X, y, random_state=0)
+
+
+class FitTimer:
+    '''
+    Mixin for pipeline steps: the duration of the last fit (fit_transform for transformers) is kept in fit_time_,
+    so it travels with the fitted step (also through the pipeline cache and the worker processes)
+    '''
+
+    def fit(self, X, y=None, **params):
+        start = time.perf_counter()
+        result = super().fit(X, y, **params)
+        self.fit_time_ = time.perf_counter() - start
+        return result
+
+    def fit_transform(self, X, y=None, **params):
+        start = time.perf_counter()
+        result = super().fit_transform(X, y, **params)
+        self.fit_time_ = time.perf_counter() - start
+        return result
+
+
+class TimedSimpleImputer(FitTimer, SimpleImputer):
+    pass
+
+
+class TimedStandardScaler(FitTimer, StandardScaler):
+    pass
+
+
+class TimedSelectKBest(FitTimer, SelectKBest):
+    pass
+
+
+class TimedElasticNetCV(FitTimer, ElasticNetCV):
+    pass
 
-    a = SimpleImputer(strategy='median')
-    b = StandardScaler()
-    c = SelectKBest(score_func=mutual_info_regression)
-    clf = ElasticNetCV(cv=10)
-    model = Pipeline([('impute', a), ('scaling', b), ('anova', c), ('rf', clf)])
+
+@profiler.timed("fit_ElasticNet")
+def fit_ElasticNet(X_train, X_test, y_train, y_test, k_values=(5, 10, 20, 40), l1_ratio=0.5, alphas=None,
+                   n_jobs=None, cache_dir=None, timings=None):
+    '''
+    Hyperparameters tuning of imputer -> scaler -> SelectKBest(mutual information) -> ElasticNetCV.
+
+    Fitted imputer/scaler/selector are cached per fold in cache_dir (a temporary directory by default),
+    and the mutual information scores are cached too, so they are computed once per fold and reused for every k.
+    alpha and l1_ratio (a value or a list) are chosen inside ElasticNetCV along its regularization path,
+    so a wider grid does not repeat the preprocessing. n_jobs spreads folds x candidates over cores.
+    If timings is a dict it is filled with the time of every stage in seconds; the per-step times (stage_<step>)
+    are the fit times of the best pipeline's steps measured during its refit, nothing is fitted again for them.
+    '''
+    own_cache = cache_dir is None
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix="fit_elasticnet_")
+    memory = Memory(cache_dir, verbose=0)
+
+    a = TimedSimpleImputer(strategy='median')
+    b = TimedStandardScaler()
+    c = TimedSelectKBest(score_func=memory.cache(mutual_info_scores))
+    clf = TimedElasticNetCV(cv=10, l1_ratio=l1_ratio, n_jobs=None if n_jobs else -1)
+    if alphas is not None:
+        clf.set_params(alphas=alphas)
+    model = Pipeline([('impute', a), ('scaling', b), ('anova', c), ('rf', clf)], memory=memory)
 
     # Grid Search CV
-    parameters = {'anova__k': [5, 10, 20, 40]}
+    parameters = {'anova__k': list(k_values)}
 
-    grid = GridSearchCV(model, parameters)
-    grid.fit(X_train, y_train)
-    y_pred = grid.predict(X_test)
+    try:
+        grid = GridSearchCV(model, parameters, n_jobs=n_jobs)
+        start = time.perf_counter()
+        grid.fit(X_train, y_train)
+        search_time = time.perf_counter() - start
+        start = time.perf_counter()
+        y_pred = grid.predict(X_test)
+        predict_time = time.perf_counter() - start
+    finally:
+        if own_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if timings is not None:
+        timings['search'] = search_time - grid.refit_time_
+        timings['refit'] = grid.refit_time_
+        timings['predict'] = predict_time
+        timings['mean_fit_time'] = {str(params): float(fit_time) for params, fit_time
+                                    in zip(grid.cv_results_['params'], grid.cv_results_['mean_fit_time'])}
+        for name, step in grid.best_estimator_.steps:
+            timings[f'stage_{name}'] = getattr(step, 'fit_time_', None)
 
     # Metrics
     metric = [grid.score(X_test, y_test),
@@ -49,8 +136,58 @@ def fit_ElasticNet(X_train, X_test, y_train, y_test):
 
     return grid, y_pred, metric
 
-def desc_calc(data, mode = 'train', log=None):
-    return getAllDescriptors(data, mode, log)
+@profiler.timed("desc_calc")
+def desc_calc(data, mode = 'train', log=None, store=None, target=None, processes=None, chunk_size=10000, work_dir=None):
+    '''
+    Function for calculating descriptors with getAllDescriptors.
+    With a DescriptorStore only molecules missing from it are calculated, the result is assembled from the store.
+    target: column of data with the target values in train mode; by default the column recorded in the store,
+    else the first column other than SMILES. When molecules are calculated, the column is checked against
+    the targets getAllDescriptors returns and recorded in the store.
+    processes: inputs longer than chunk_size are calculated chunk by chunk in a process pool, finished chunks
+    are kept in work_dir (float32) and a rerun with the same work_dir resumes from them; without work_dir
+    they go to a temporary directory that is deleted afterwards
+    '''
+    def calculate(frame):
+        if processes is None or len(frame) <= chunk_size:
+            return getAllDescriptors(frame, mode, log)
+        return get_descriptors_parallel(frame, mode, log, work_dir, chunk_size, processes)
+
+    profiler.count("desc_calc.molecules", len(data))
+    if store is None:
+        return calculate(data)
+    target = target or store.get_meta("target") or next((column for column in data.columns if column != 'SMILES'), None)
+
+    keys = [canonical_smiles(smiles) for smiles in data['SMILES']]
+    known = store.lookup(keys)
+    missing = list({key: position for position, key in enumerate(keys) if key not in known}.values())
+    profiler.count("desc_calc.store_hits", len(keys) - len(missing))
+    if missing:
+        computed = calculate(data.iloc[missing].reset_index(drop=True))
+        if 'SMILES' in computed.columns:
+            computed_keys = [canonical_smiles(smiles) for smiles in computed['SMILES']]
+        elif len(computed) == len(missing):
+            computed_keys = [keys[position] for position in missing]
+        else:
+            raise ValueError("getAllDescriptors dropped molecules, cannot match its rows to SMILES")
+        if 'Target' in computed.columns:
+            expected = data[target].iloc[missing].to_numpy(dtype=np.float64)
+            if not np.allclose(computed['Target'].to_numpy(dtype=np.float64), expected, equal_nan=True):
+                raise ValueError(f"column {target!r} does not hold the targets of getAllDescriptors, pass target=")
+            store.set_meta("target", target)
+        store.put(computed_keys, computed.drop(columns=['SMILES', 'Target'], errors='ignore'))
+        store.set_meta(f"layout_{mode}", list(computed.columns))
+
+    descriptors = store.load(keys)
+    layout = store.get_meta(f"layout_{mode}")
+    if layout is None:
+        layout = store.columns + (['Target'] if mode == 'train' else ['SMILES'])
+    if 'SMILES' in layout:
+        descriptors['SMILES'] = data['SMILES'].values
+    if 'Target' in layout:
+        descriptors['Target'] = data[target].values
+    return descriptors[layout]
+
 def sar_model_evaluation(descriptors: pd.DataFrame):
     '''
     Function for model evaluation with functionCopyFromRegression().
@@ -64,14 +201,24 @@ def sar_model_evaluation(descriptors: pd.DataFrame):
     return model1, y_pred1, metrics1
 
 
-def sar_model_train(descriptors_train: pd.DataFrame, indices):
+SAR_ARTIFACT_VERSION = 1
+
+
+def descriptors_hash(descriptors: pd.DataFrame):
+    return hashlib.sha256(pd.util.hash_pandas_object(descriptors, index=False).values.tobytes()).hexdigest()
+
+
+@profiler.timed("sar_model_train")
+def sar_model_train(descriptors_train: pd.DataFrame, indices, artifact_path=None):
     '''
     Function for training the model with best paramaters.
     Don't forget to add here the input arguments required by the selected model.
+    With artifact_path the fitted model is saved there, see save_sar_model.
     '''
 
     y_train = descriptors_train['Target']
     X_train = descriptors_train.drop(['Target'], axis=1)
+    columns = list(X_train.columns)
     X_train = X_train[X_train.columns[indices]]  # keeping only necessary descriptors according to ANOVA evaluation
 
     # reproducing the pipeline from GridSearchCV but for one selected model
@@ -81,9 +228,42 @@ def sar_model_train(descriptors_train: pd.DataFrame, indices):
     model = Pipeline([('impute', a), ('scaling', b), ('rf', clf)])  # without ANOVA now
 
     model.fit(X_train, y_train)
+    if artifact_path is not None:
+        save_sar_model(artifact_path, model, columns, indices, descriptors_hash(descriptors_train))
     return model
 
 
+def save_sar_model(path, model, columns, indices, training_hash):
+    '''
+    Saves a versioned artifact: fitted pipeline, ANOVA indices, descriptor schema and training data hash.
+    Stored uncompressed so load_sar_model can memory-map the arrays.
+    '''
+
+    artifact = {'version': SAR_ARTIFACT_VERSION,
+                'model': model,
+                'indices': np.asarray(indices),
+                'columns': columns,
+                'features': [columns[i] for i in indices],
+                'training_hash': training_hash}
+    joblib.dump(artifact, path)
+
+
+def load_sar_model(path, training_hash=None):
+    '''
+    Loads an artifact written by save_sar_model with memory-mapped arrays.
+    Returns None if there is no artifact, it has another version or (with training_hash) other training data.
+    '''
+
+    if not os.path.exists(path):
+        return None
+    artifact = joblib.load(path, mmap_mode='r')
+    if not isinstance(artifact, dict) or artifact.get('version') != SAR_ARTIFACT_VERSION:
+        return None
+    if training_hash is not None and artifact['training_hash'] != training_hash:
+        return None
+    return artifact
+
+
 def sar_model_predict(model, descriptors_pred, indices):
     '''
     Function for casting predictions on unseen data
@@ -94,6 +274,23 @@ def sar_model_predict(model, descriptors_pred, indices):
     return model.predict(X_pred)
 
 
+@profiler.timed("sar_model_predict")
+def sar_model_predict_batch(model, descriptors_pred, indices, chunk_size=None):
+    '''
+    Function for casting predictions on the whole descriptor matrix in one call (or chunk_size rows per call)
+    Returns a Series of predictions indexed by SMILES, duplicate SMILES are scored once
+    '''
+
+    unique = descriptors_pred.drop_duplicates(subset='SMILES')
+    X_pred = unique[unique.columns[indices]]
+    if chunk_size is None or len(X_pred) <= chunk_size:
+        pred = model.predict(X_pred)
+    else:
+        pred = np.concatenate([model.predict(X_pred.iloc[start:start + chunk_size])
+                               for start in range(0, len(X_pred), chunk_size)])
+    return pd.Series(pred, index=unique['SMILES'].values, name='Prediction')
+
+
 '''
 PUBCHEM PART
 '''
@@ -104,10 +301,9 @@ def pubchem_parsing(url):
     Function for Pubchem request
     '''
 
-    req = urllib.request.Request(url)
-    res = urllib.request.urlopen(req).read()
-    fin = json.loads(res.decode())
-    return fin
+    res = default_transport().get(url)
+    res.raise_for_status()
+    return res.json()
 
 
 def get_similar_cids(compound_smiles, threshold=95, maxentries=10):
@@ -137,6 +333,45 @@ def get_xlogp(compound_cid):
         return None
 
 
+@profiler.timed("pubchem.similarity")
+def get_similar_cids_many(compounds_smiles, threshold=95, maxentries=10, max_workers=5, index=None):
+    '''
+    Function for running fastsimilarity_2d for many compounds concurrently
+    With a local SimilarityIndex the search runs offline instead of on PubChem
+    Returns {smiles: [cids]}, duplicate SMILES are queried once
+    '''
+
+    unique_smiles = list(dict.fromkeys(compounds_smiles))
+    if index is not None:
+        return dict(zip(unique_smiles, index.search(unique_smiles, threshold, maxentries)))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        similar = pool.map(lambda smiles: get_similar_cids(smiles, threshold, maxentries), unique_smiles)
+        return dict(zip(unique_smiles, similar))
+
+
+@profiler.timed("pubchem.xlogp")
+def get_xlogp_batch(compound_cids, chunk_size=100, max_workers=5):
+    '''
+    Function for parsing XLogP of many CIDs with the comma-separated compound/cid/.../property/ form
+    Returns {cid: xlogp}, CIDs without XLogP map to None
+    '''
+
+    unique_cids = list(dict.fromkeys(compound_cids))
+    chunks = [unique_cids[i:i + chunk_size] for i in range(0, len(unique_cids), chunk_size)]
+
+    def fetch(chunk):
+        pubchem_pug_rest_api_link = "https://pubchem.ncbi.nlm.nih.gov/rest/pug/"
+        pubchem_pug_rest_api_link += "compound/cid/%s/property/XLogP/JSON" % ','.join(map(str, chunk))
+        return pubchem_parsing(pubchem_pug_rest_api_link)['PropertyTable']['Properties']
+
+    xlogp = dict.fromkeys(unique_cids)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for properties in pool.map(fetch, chunks):
+            for prop in properties:
+                xlogp[prop['CID']] = prop.get('XLogP')
+    return xlogp
+
+
 '''
 MAIN PART
 '''
@@ -150,38 +385,56 @@ if __name__ == "__main__":
     pred_data = pd.read_csv('logp_inputs.csv')
     cpds = [row for row in pred_data.loc[:, 'SMILES']]
 
-    # calculating descriptors
+    # calculating descriptors, molecules seen in earlier runs are taken from the store
+    store = DescriptorStore()
     print("Calculating descriptors for training data...")
-    train_descriptors = desc_calc(train_data)
+    train_descriptors = desc_calc(train_data, store=store)
     print("Calculating descriptors for prediction data...")
-    pred_descriptors = desc_calc(pred_data, mode='')
-
-    # finding best estimator
-    print("Evaluating regression model parameters...")
-    model = sar_model_evaluation(train_descriptors)
-    print('Best parameters are:', model[0].best_params_)
-    cols = model[0].best_estimator_.named_steps['anova'].get_support(indices=True)  # this are indices from ANOVA
-    # add here other parameters from GridSearchCV best estimator (e.g. alpha for Ridge Regression)
-
-    # train the best estimator and predict values
-    print("Training the model with the best parameters...")
-    final_model = sar_model_train(train_descriptors, cols)
+    pred_descriptors = desc_calc(pred_data, mode='', store=store)
+
+    # a model saved by an earlier run on the same training data is reused
+    artifact = load_sar_model('sar_model.joblib', descriptors_hash(train_descriptors))
+    if artifact is not None:
+        print("Using the saved model trained on the same data...")
+        final_model, cols = artifact['model'], artifact['indices']
+    else:
+        # finding best estimator
+        print("Evaluating regression model parameters...")
+        model = sar_model_evaluation(train_descriptors)
+        print('Best parameters are:', model[0].best_params_)
+        cols = model[0].best_estimator_.named_steps['anova'].get_support(indices=True)  # this are indices from ANOVA
+        # add here other parameters from GridSearchCV best estimator (e.g. alpha for Ridge Regression)
+
+        # train the best estimator and predict values
+        print("Training the model with the best parameters...")
+        final_model = sar_model_train(train_descriptors, cols, 'sar_model.joblib')
 
     result = []  # for why this was in cycle?
 
+    preds = sar_model_predict_batch(final_model, pred_descriptors, cols)  # one call for all compounds
     for cpd in cpds:
-        cpd_descriptors = pred_descriptors[pred_descriptors['SMILES'] == cpd]
-        pred = sar_model_predict(final_model, cpd_descriptors, cols)
-        print(f"Predicted LogP value for compound {cpd}:", pred)
+        print(f"Predicted LogP value for compound {cpd}:", preds[cpd])
+
+    with profiler.span("pubchem", compounds=len(cpds)):
+        # offline search when a local index (see similarity_index.build_similarity_index) is present
+        index = SimilarityIndex('similarity_index') if os.path.exists('similarity_index') else None
 
         print("Searching for similar compunds...")
-        similarity = get_similar_cids(cpd, threshold=95, maxentries=10)  # related pubchem function
+        similarity = get_similar_cids_many(cpds, threshold=95, maxentries=10, index=index)  # related pubchem function
 
         print("Filtering logP...")
-        for cid in similarity:
-            xlogp = get_xlogp(cid)  # related pubchem function
-            if xlogp:
-                if xlogp <= pred * 1.1 and xlogp >= pred * 0.9:
-                    result.append((cid, xlogp))
-
-        print(f"Request for compound {cpd} completed. I found the following CIDs in PubChem with XLogP in the range of {pred}+- 10%: {result}")
\ No newline at end of file
+        similar_cids = [cid for cids in similarity.values() for cid in cids]
+        if index is not None:
+            xlogps = index.xlogp(similar_cids)
+        else:
+            xlogps = get_xlogp_batch(similar_cids)  # one request per 100 CIDs
+
+        for cpd in cpds:
+            pred = preds[cpd]
+            for cid in similarity[cpd]:
+                xlogp = xlogps.get(cid)
+                if xlogp:
+                    if xlogp <= pred * 1.1 and xlogp >= pred * 0.9:
+                        result.append((cid, xlogp))
+
+            print(f"Request for compound {cpd} completed. I found the following CIDs in PubChem with XLogP in the range of {pred}+- 10%: {result}")
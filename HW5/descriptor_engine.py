@@ -0,0 +1,126 @@
+'''
+Parallel, chunked descriptor calculation for large compound libraries.
+
+The input is cut into fixed chunks of rows which a process pool runs through getAllDescriptors.
+Every finished chunk is written to the work directory right away as a float32 matrix stored column by
+column (chunk_<i>.npy, shape n_descriptors x n_rows), so memory stays bounded and an interrupted run
+resumes from the chunks that are already on disk. The manifest records a hash of the input, so a
+work directory is only resumed for the same molecules.
+'''
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+
+def chunk_path(work_dir, index, suffix=''):
+    return os.path.join(work_dir, f"chunk_{index:06d}{suffix}.npy")
+
+
+def save_array(path, array):
+    temp_path = path + ".tmp.npy"
+    np.save(temp_path, array)
+    os.replace(temp_path, path)
+
+
+def input_hash(data):
+    '''
+    Hash of the input rows (SMILES and, in train mode, the target values)
+    '''
+    return hashlib.sha256(pd.util.hash_pandas_object(data, index=False).values.tobytes()).hexdigest()
+
+
+def compute_chunk(work_dir, index, chunk, mode, log):
+    '''
+    Worker: calculates descriptors for one chunk and writes them to disk.
+    Returns the chunk index and the column layout of getAllDescriptors.
+    '''
+    from molecular_descriptors import getAllDescriptors
+
+    computed = getAllDescriptors(chunk.reset_index(drop=True), mode, log)
+    if len(computed) != len(chunk):
+        raise ValueError(f"chunk {index}: getAllDescriptors returned {len(computed)} rows for {len(chunk)} molecules")
+    if 'Target' in computed.columns:
+        save_array(chunk_path(work_dir, index, '.target'), computed['Target'].to_numpy(dtype=np.float64))
+    descriptors = computed.drop(columns=['SMILES', 'Target'], errors='ignore')
+    # written last: its presence marks the chunk as done
+    save_array(chunk_path(work_dir, index), np.ascontiguousarray(descriptors.to_numpy(dtype=np.float32).T))
+    return index, list(computed.columns)
+
+
+def get_descriptors_parallel(data, mode='train', log=None, work_dir=None, chunk_size=10000, processes=None):
+    '''
+    Same result as getAllDescriptors(data, mode, log), with float32 descriptor columns.
+    Pass the same work_dir again to resume an interrupted run; without one the chunks go to a temporary
+    directory that is removed before returning.
+    '''
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="descriptors_")
+        try:
+            return compute_descriptors(data, mode, log, work_dir, chunk_size, processes)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir, exist_ok=True)
+    return compute_descriptors(data, mode, log, work_dir, chunk_size, processes)
+
+
+def compute_descriptors(data, mode, log, work_dir, chunk_size, processes):
+    manifest_path = os.path.join(work_dir, "manifest.json")
+    n_chunks = (len(data) + chunk_size - 1) // chunk_size
+    manifest = {"rows": len(data), "chunk_size": chunk_size, "mode": mode, "input_hash": input_hash(data)}
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            saved = json.load(file)
+        differs = [key for key, value in manifest.items() if saved.get(key) != value]
+        if differs:
+            raise ValueError(f"{work_dir} holds a run for other input (different {', '.join(differs)})")
+        manifest = saved
+        todo = [index for index in range(n_chunks) if not os.path.exists(chunk_path(work_dir, index))]
+    else:
+        # chunks without a manifest cannot be matched to their input, they are all recomputed
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file)
+        todo = list(range(n_chunks))
+
+    if n_chunks and "layout" not in manifest and 0 not in todo:
+        todo.insert(0, 0)  # interrupted before the layout was recorded
+    if todo:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(compute_chunk, work_dir, index,
+                                   data.iloc[index * chunk_size:(index + 1) * chunk_size], mode, log)
+                       for index in todo]
+            for future in as_completed(futures):
+                index, layout = future.result()
+                if "layout" not in manifest:
+                    manifest["layout"] = layout
+                    with open(manifest_path, 'w') as file:
+                        json.dump(manifest, file)
+
+    return load_descriptors(work_dir, data)
+
+
+def load_descriptors(work_dir, data):
+    '''
+    Assembles the DataFrame of a finished run; SMILES are taken from data
+    '''
+    with open(os.path.join(work_dir, "manifest.json")) as file:
+        manifest = json.load(file)
+    layout = manifest["layout"]
+    columns = [column for column in layout if column not in ('SMILES', 'Target')]
+    n_chunks = (manifest["rows"] + manifest["chunk_size"] - 1) // manifest["chunk_size"]
+
+    matrix = np.concatenate([np.load(chunk_path(work_dir, index), mmap_mode='r') for index in range(n_chunks)],
+                            axis=1)
+    descriptors = pd.DataFrame(dict(zip(columns, matrix)), index=data.index)
+    if 'Target' in layout:
+        descriptors['Target'] = np.concatenate([np.load(chunk_path(work_dir, index, '.target'))
+                                                for index in range(n_chunks)])
+    if 'SMILES' in layout:
+        descriptors['SMILES'] = data['SMILES'].values
+    return descriptors[layout]
@@ -0,0 +1,143 @@
+'''
+Persistent store of molecular descriptors keyed by canonical SMILES and descriptor-set version.
+
+Descriptor rows live in one append-only float64 matrix per version (<path>/<version>.f8) that is
+memory-mapped for reading; a SQLite index maps (canonical SMILES, version) to the row number.
+Writes are serialized (a lock per store directory and an immediate SQLite transaction across processes),
+and rows left in the matrix by an interrupted write are cut off before the next append.
+'''
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    from rdkit import Chem
+except ImportError:
+    Chem = None
+
+
+def canonical_smiles(smiles):
+    '''
+    RDKit canonical SMILES; the input is kept as is when RDKit is missing or cannot parse it
+    '''
+    if Chem is None:
+        return smiles
+    mol = Chem.MolFromSmiles(smiles)
+    return smiles if mol is None else Chem.MolToSmiles(mol)
+
+
+def descriptor_set_version():
+    '''
+    Hash of molecular_descriptors.py, so cached rows are invalidated when the descriptor code changes
+    '''
+    import molecular_descriptors
+    with open(molecular_descriptors.__file__, 'rb') as source:
+        return hashlib.sha1(source.read()).hexdigest()[:12]
+
+
+_write_locks = {}
+_write_locks_guard = threading.Lock()
+
+
+def write_lock(path):
+    '''
+    One lock per store directory, shared by all DescriptorStore instances of the process
+    '''
+    with _write_locks_guard:
+        return _write_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class DescriptorStore:
+    '''
+    Constructor params:
+      path: directory of the store
+      version: descriptor-set version, descriptor_set_version() by default
+    '''
+
+    def __init__(self, path="descriptor_store", version=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.version = version or descriptor_set_version()
+        self.matrix_path = os.path.join(path, f"{self.version}.f8")
+        self.db = sqlite3.connect(os.path.join(path, "index.sqlite"), timeout=60)
+        self.lock = write_lock(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS molecules ("
+                        "smiles TEXT NOT NULL, version TEXT NOT NULL, row INTEGER NOT NULL, "
+                        "PRIMARY KEY (smiles, version))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.db.commit()
+        self.columns = self.get_meta("columns")
+
+    def get_meta(self, name):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (f"{self.version}:{name}",)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set_meta(self, name, value):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"{self.version}:{name}", json.dumps(value)))
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM molecules WHERE version = ?", (self.version,)).fetchone()[0]
+
+    def lookup(self, keys):
+        '''
+        Returns {canonical SMILES: row} for the keys that are stored
+        '''
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(unique_keys), 500):
+            chunk = unique_keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.db.execute(f"SELECT smiles, row FROM molecules WHERE version = ? AND smiles IN ({placeholders})",
+                                   (self.version, *chunk))
+            found.update(rows)
+        return found
+
+    def put(self, keys, descriptors: pd.DataFrame):
+        '''
+        Appends descriptor rows for keys; keys that are already stored are skipped
+        '''
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.columns = self.columns or self.get_meta("columns")
+                if self.columns is None:
+                    self.columns = list(descriptors.columns)
+                    self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                    (f"{self.version}:columns", json.dumps(self.columns)))
+                known = self.lookup(keys)
+                new = [position for position, key in enumerate(keys) if key not in known]
+                new = list({keys[position]: position for position in new}.values())  # first row of every duplicate key
+                if new:
+                    values = descriptors.reindex(columns=self.columns).iloc[new].to_numpy(dtype=np.float64)
+                    first_row = len(self)
+                    with open(self.matrix_path, 'ab') as matrix:
+                        # rows written by a run that died before its commit are not in the index, drop them
+                        matrix.truncate(first_row * len(self.columns) * 8)
+                        matrix.write(np.ascontiguousarray(values).tobytes())
+                    self.db.executemany("INSERT INTO molecules VALUES (?, ?, ?)",
+                                        [(keys[position], self.version, first_row + i)
+                                         for i, position in enumerate(new)])
+            except BaseException:
+                self.db.rollback()
+                raise
+            self.db.commit()
+
+    def matrix(self):
+        rows = len(self)
+        if rows == 0:
+            return np.empty((0, len(self.columns or [])))
+        return np.memmap(self.matrix_path, dtype=np.float64, mode='r', shape=(rows, len(self.columns)))
+
+    def load(self, keys):
+        '''
+        Returns a DataFrame with one row of descriptors per key, in the order of keys; every key must be stored
+        '''
+        found = self.lookup(keys)
+        rows = [found[key] for key in keys]
+        return pd.DataFrame(self.matrix()[rows], columns=self.columns)
@@ -0,0 +1,95 @@
+'''
+Long-lived SAR scoring process.
+
+Loads the model artifact saved by sar_model_train once (arrays are memory-mapped) and predicts LogP
+for SMILES read one per line from stdin, or from clients of a TCP socket with --port.
+Every answer is a "<SMILES>\t<prediction>" line; "nan" when the descriptors cannot be calculated.
+
+Usage:
+  python sar_predictor.py sar_model.joblib < smiles.txt
+  python sar_predictor.py sar_model.joblib --port 5555
+'''
+import argparse
+import socketserver
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from HW5 import desc_calc, load_sar_model
+from descriptor_store import DescriptorStore
+
+# what the descriptor calculation raises for a molecule it cannot handle (e.g. RDKit returning None);
+# store and schema errors (sqlite3.Error, KeyError) are not among them and reach the caller
+DESCRIPTOR_ERRORS = (ValueError, TypeError, AttributeError, ArithmeticError)
+
+
+class SarPredictor:
+    def __init__(self, artifact_path, store_path="descriptor_store"):
+        artifact = load_sar_model(artifact_path)
+        if artifact is None:
+            raise ValueError(f"{artifact_path}: no SAR model artifact of a supported version")
+        self.model = artifact['model']
+        self.features = artifact['features']
+        self.store_path = store_path
+        # one DescriptorStore (SQLite connection) per thread; their writes go through the store's
+        # per-directory lock and one SQLite transaction, so concurrent clients cannot mix up rows
+        self._local = threading.local()
+
+    def store(self):
+        if not hasattr(self._local, 'store'):
+            self._local.store = DescriptorStore(self.store_path)
+        return self._local.store
+
+    def predict(self, smiles_list):
+        try:
+            descriptors = desc_calc(pd.DataFrame({'SMILES': smiles_list}), mode='', store=self.store())
+        except DESCRIPTOR_ERRORS:
+            if len(smiles_list) == 1:
+                return np.array([np.nan])
+            # find the molecules that fail one by one
+            return np.concatenate([self.predict([smiles]) for smiles in smiles_list])
+        return self.model.predict(descriptors[self.features])
+
+    def answer(self, line):
+        smiles = line.strip()
+        if not smiles:
+            return None
+        return f"{smiles}\t{self.predict([smiles])[0]}\n"
+
+
+def serve_stdin(predictor):
+    for line in sys.stdin:
+        answer = predictor.answer(line)
+        if answer is not None:
+            sys.stdout.write(answer)
+            sys.stdout.flush()
+
+
+def serve_socket(predictor, host, port):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                answer = predictor.answer(line.decode())
+                if answer is not None:
+                    self.wfile.write(answer.encode())
+
+    with socketserver.ThreadingTCPServer((host, port), Handler) as server:
+        server.daemon_threads = True
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict LogP for SMILES with a saved SAR model")
+    parser.add_argument('artifact', help="model saved by sar_model_train, e.g. sar_model.joblib")
+    parser.add_argument('--store', default="descriptor_store", help="DescriptorStore directory")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, help="serve a TCP socket instead of stdin")
+    args = parser.parse_args()
+
+    predictor = SarPredictor(args.artifact, args.store)
+    if args.port is None:
+        serve_stdin(predictor)
+    else:
+        serve_socket(predictor, args.host, args.port)
@@ -0,0 +1,187 @@
+'''
+Offline replacement for PubChem fastsimilarity_2d.
+
+An index directory is built once from a compound dump (CID, SMILES, XLogP columns) and holds
+  fingerprints.u64  bit-packed Morgan fingerprints, n_bits / 64 uint64 words per compound
+  counts.u16        number of set bits of every fingerprint
+  cids.i64, xlogp.f8
+  sorted_cids.i64, sorted_rows.i64  CIDs in ascending order and their rows, for binary-search lookups
+  meta.json
+The files are memory-mapped, queries compute Tanimoto similarities with vectorized popcount,
+a block of queries against every block of fingerprints at once.
+'''
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    from rdkit import Chem
+    from rdkit.Chem import rdFingerprintGenerator
+except ImportError:
+    Chem = None
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(words):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+else:
+    BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+    def popcount(words):
+        packed = np.ascontiguousarray(words).view(np.uint8)
+        return BYTE_COUNTS[packed].sum(axis=-1, dtype=np.int64)
+
+
+def fingerprints(smiles_list, n_bits=2048, radius=2):
+    '''
+    Returns the packed fingerprints (len x n_bits / 64 uint64) and a mask of the SMILES RDKit could parse
+    '''
+    if Chem is None:
+        raise ImportError("similarity_index needs RDKit: pip install rdkit")
+    if n_bits % 64:
+        raise ValueError("n_bits has to be a multiple of 64")
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=radius, fpSize=n_bits)
+    packed = np.zeros((len(smiles_list), n_bits // 64), dtype=np.uint64)
+    valid = np.zeros(len(smiles_list), dtype=bool)
+    for row, smiles in enumerate(smiles_list):
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None:
+            continue
+        bits = generator.GetFingerprintAsNumPy(mol).astype(np.uint8)
+        packed[row] = np.packbits(bits, bitorder='little').view(np.uint64)
+        valid[row] = True
+    return packed, valid
+
+
+def build_similarity_index(dump_path, index_dir, n_bits=2048, radius=2, chunksize=100000):
+    '''
+    Builds an index from a CSV/TSV dump with CID, SMILES and XLogP columns, chunksize rows at a time
+    '''
+    os.makedirs(index_dir, exist_ok=True)
+    sep = '\t' if dump_path.endswith(('.tsv', '.txt')) else ','
+    files = {name: open(os.path.join(index_dir, name), 'wb')
+             for name in ('fingerprints.u64', 'counts.u16', 'cids.i64', 'xlogp.f8')}
+    size = 0
+    try:
+        for chunk in pd.read_csv(dump_path, sep=sep, usecols=['CID', 'SMILES', 'XLogP'], chunksize=chunksize):
+            packed, valid = fingerprints(chunk['SMILES'].astype(str).tolist(), n_bits, radius)
+            packed = packed[valid]
+            files['fingerprints.u64'].write(packed.tobytes())
+            files['counts.u16'].write(popcount(packed).astype(np.uint16).tobytes())
+            files['cids.i64'].write(chunk['CID'].to_numpy(dtype=np.int64)[valid].tobytes())
+            files['xlogp.f8'].write(pd.to_numeric(chunk['XLogP'], errors='coerce').to_numpy(dtype=np.float64)[valid].tobytes())
+            size += int(valid.sum())
+    finally:
+        for file in files.values():
+            file.close()
+    if size:
+        write_cid_lookup(index_dir, np.fromfile(os.path.join(index_dir, 'cids.i64'), dtype=np.int64))
+    with open(os.path.join(index_dir, 'meta.json'), 'w') as meta:
+        json.dump({'size': size, 'n_bits': n_bits, 'radius': radius}, meta)
+    return SimilarityIndex(index_dir)
+
+
+def write_cid_lookup(index_dir, cids):
+    order = np.argsort(cids, kind='stable')
+    cids[order].tofile(os.path.join(index_dir, 'sorted_cids.i64'))
+    order.astype(np.int64).tofile(os.path.join(index_dir, 'sorted_rows.i64'))
+
+
+class SimilarityIndex:
+    '''
+    Memory-mapped fingerprint index; search() follows the threshold (percent) / maxentries interface
+    of get_similar_cids.
+    '''
+
+    def __init__(self, index_dir, block_size=200000):
+        with open(os.path.join(index_dir, 'meta.json')) as meta:
+            self.meta = json.load(meta)
+        self.block_size = block_size
+        size = self.meta['size']
+        words = self.meta['n_bits'] // 64
+
+        def load(name, dtype, shape):
+            if size == 0:
+                return np.zeros(shape, dtype=dtype)
+            return np.memmap(os.path.join(index_dir, name), dtype=dtype, mode='r', shape=shape)
+
+        self.fingerprints = load('fingerprints.u64', np.uint64, (size, words))
+        self.counts = load('counts.u16', np.uint16, (size,))
+        self.cids = load('cids.i64', np.int64, (size,))
+        self.xlogp_values = load('xlogp.f8', np.float64, (size,))
+        if size and not os.path.exists(os.path.join(index_dir, 'sorted_cids.i64')):
+            write_cid_lookup(index_dir, np.array(self.cids))  # index built before the lookup files existed
+        self.sorted_cids = load('sorted_cids.i64', np.int64, (size,))
+        self.sorted_rows = load('sorted_rows.i64', np.int64, (size,))
+
+    def __len__(self):
+        return self.meta['size']
+
+    def score_blocks(self, queries):
+        '''
+        Yields (start, scores): Tanimoto similarities (len(queries) x block rows) of the packed queries to
+        each block of fingerprints. Blocks shrink with the number of queries, so the temporary
+        queries x rows x words array stays the size of one block_size block of a single query.
+        '''
+        query_counts = popcount(queries)
+        rows = max(1, self.block_size // len(queries))
+        for start in range(0, len(self), rows):
+            block = self.fingerprints[start:start + rows]
+            common = popcount(block[None, :, :] & queries[:, None, :])
+            union = self.counts[start:start + rows].astype(np.int64)[None, :] + query_counts[:, None] - common
+            yield start, np.divide(common, union, out=np.zeros(common.shape, dtype=np.float32), where=union > 0)
+
+    def similarities(self, query):
+        '''
+        Tanimoto similarity of one packed fingerprint to every compound
+        '''
+        result = np.empty(len(self), dtype=np.float32)
+        for start, scores in self.score_blocks(query[None, :]):
+            result[start:start + scores.shape[1]] = scores[0]
+        return result
+
+    def search(self, smiles_list, threshold=95, maxentries=10, query_block=64):
+        '''
+        Returns one list of CIDs per SMILES: compounds with Tanimoto >= threshold percent, best first,
+        at most maxentries (None for all). threshold=0 gives a plain top-k query.
+        Up to query_block queries share one pass over the fingerprints.
+        '''
+        packed, valid = fingerprints(smiles_list, self.meta['n_bits'], self.meta['radius'])
+        results = [[] for _ in smiles_list]
+        positions = np.flatnonzero(valid) if len(self) else np.empty(0, dtype=np.int64)
+        for first in range(0, len(positions), query_block):
+            batch = positions[first:first + query_block]
+            best_scores = [np.empty(0, dtype=np.float32) for _ in batch]
+            best_rows = [np.empty(0, dtype=np.int64) for _ in batch]
+            for start, scores in self.score_blocks(packed[batch]):
+                for j, row_scores in enumerate(scores):
+                    hits = np.flatnonzero(row_scores >= threshold / 100)
+                    if not len(hits):
+                        continue
+                    candidate_scores = np.concatenate([best_scores[j], row_scores[hits]])
+                    candidate_rows = np.concatenate([best_rows[j], hits + start])
+                    if maxentries is not None and len(candidate_rows) > maxentries:
+                        keep = np.lexsort((candidate_rows, -candidate_scores))[:maxentries]
+                        candidate_scores, candidate_rows = candidate_scores[keep], candidate_rows[keep]
+                    best_scores[j], best_rows[j] = candidate_scores, candidate_rows
+            for j, position in enumerate(batch):
+                order = np.lexsort((best_rows[j], -best_scores[j]))  # best first, ties in index order
+                results[position] = self.cids[best_rows[j][order]].tolist()
+        return results
+
+    def xlogp(self, cids):
+        '''
+        Returns {cid: xlogp} from the dump, None where XLogP is missing
+        '''
+        cids = list(cids)
+        if not cids:
+            return {}
+        wanted = np.asarray(cids, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_cids, wanted), max(len(self) - 1, 0))
+        found = (self.sorted_cids[positions] == wanted) if len(self) else np.zeros(len(wanted), dtype=bool)
+        result = {}
+        for cid, position, ok in zip(cids, positions.tolist(), found.tolist()):
+            value = self.xlogp_values[self.sorted_rows[position]] if ok else np.nan
+            result[cid] = None if np.isnan(value) else float(value)
+        return result
@@ -0,0 +1,400 @@
+'''
+Offline benchmarks of the FASTA, database lookup, SAR and Car hot paths.
+
+Every workload runs on synthetic data (synthetic.py) and, where the code talks to a web service, against
+a local stub replaying recorded responses (stub_server.py) with a configurable latency, so results do not
+depend on the network. For every workload the harness records
+  throughput: items per second over the median run (MB/s, IDs/s, rows/s, ...)
+  latency_p50 / p95 / p99: time of one run, seconds (per request for the lookups, from Transport.stats)
+  peak_memory_mb: peak of Python allocations (tracemalloc) during one extra run
+and compares them with baseline.json: a workload regresses when its throughput drops or its peak memory grows
+by more than --tolerance. The exit status is 1 if anything regressed.
+
+Usage:
+  python benchmarks/run.py                               all workloads at the default sizes
+  python benchmarks/run.py fasta_parse_dna car_simulation  only these
+  python benchmarks/run.py --fasta-mb 1024 --latency 0.1   gigabyte fasta files, slower services
+  python benchmarks/run.py --update-baseline              store the results as the new baseline
+
+The SAR and PubChem workloads need HW5's molecular_descriptors module and are skipped without it.
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+for directory in (ROOT, os.path.join(ROOT, 'HW2'), os.path.join(ROOT, 'HW3'), os.path.join(ROOT, 'HW5')):
+    if directory not in sys.path:
+        sys.path.append(directory)
+
+from synthetic import cached_fasta, descriptor_table, fasta_ids, smiles
+from stub_server import StubServer, redirect
+
+BASELINE = os.path.join(BENCHMARKS, 'baseline.json')
+RESPONSES = os.path.join(BENCHMARKS, 'responses.json')
+
+# details: optional callable returning extra metrics after the runs, repeats: overrides --repeats
+Workload = namedtuple('Workload', ['run', 'items', 'unit', 'details', 'repeats'], defaults=[None, None])
+
+WORKLOADS = {}
+
+
+class Skip(Exception):
+    pass
+
+
+def workload(name):
+    def register(function):
+        WORKLOADS[name] = contextmanager(function)
+        return function
+    return register
+
+
+def import_hw5():
+    try:
+        import HW5
+    except ImportError as error:
+        raise Skip(f"HW5 cannot be imported ({error})")
+    return HW5
+
+
+'''
+FASTA
+'''
+
+
+def fasta_parse(kind):
+    def setup(args):
+        from HW2_2 import BioPythonLib
+        path = cached_fasta(args.data_dir, kind, args.fasta_mb)
+
+        def run():
+            BioPythonLib(path).stats
+
+        yield Workload(run, os.path.getsize(path) / 2 ** 20, 'MB/s')
+    return setup
+
+
+def fasta_ids_parallel(kind):
+    def setup(args):
+        from concurrent.futures import ProcessPoolExecutor
+        import id_extraction
+        path = cached_fasta(args.data_dir, kind, args.fasta_mb)
+        with ProcessPoolExecutor(args.processes) as pool:
+            def run():
+                id_extraction.extract_ids(path, kind, args.processes, pool)
+
+            yield Workload(run, os.path.getsize(path) / 2 ** 20, 'MB/s')
+    return setup
+
+
+for _kind in ('DNA', 'Protein'):
+    workload(f"fasta_parse_{_kind.lower()}")(fasta_parse(_kind))
+    workload(f"fasta_ids_parallel_{_kind.lower()}")(fasta_ids_parallel(_kind))
+
+
+'''
+DATABASE LOOKUPS
+'''
+
+
+def request_latencies(transport):
+    def details():
+        stats = next(iter(transport.stats().values()), {})
+        return {"requests": stats.get("requests"),
+                "request_p50": stats.get("latency_p50"),
+                "request_p95": stats.get("latency_p95")}
+    return details
+
+
+def database_lookup(db, kind):
+    def setup(args):
+        from HW2_1 import CHUNK_SIZE, DB_CLIENT, fetch_batched
+        from transport import Transport
+        get_function, parse_function = DB_CLIENT[db]
+        ids = fasta_ids(kind, args.ids)
+        with StubServer(RESPONSES, args.latency, args.jitter) as server:
+            transport = redirect(Transport(), server)
+
+            def run():
+                fetch_batched(ids, get_function, parse_function, CHUNK_SIZE[db], args.workers, transport)
+
+            yield Workload(run, len(ids), 'IDs/s', request_latencies(transport))
+    return setup
+
+
+workload("lookup_uniprot")(database_lookup("uniprot", 'Protein'))
+workload("lookup_ensembl")(database_lookup("ensembl", 'DNA'))
+
+
+@workload("pubchem_similarity")
+def pubchem_similarity(args):
+    HW5 = import_hw5()
+    compounds = smiles(args.compounds, seed=1)
+    with StubServer(RESPONSES, args.latency, args.jitter) as server:
+        transport = redirect(HW5.default_transport(), server)
+
+        def run():
+            HW5.get_similar_cids_many(compounds, max_workers=args.workers)
+
+        yield Workload(run, len(compounds), 'compounds/s', request_latencies(transport))
+
+
+@workload("pubchem_xlogp")
+def pubchem_xlogp(args):
+    HW5 = import_hw5()
+    cids = list(range(1, args.ids + 1))
+    with StubServer(RESPONSES, args.latency, args.jitter) as server:
+        transport = redirect(HW5.default_transport(), server)
+
+        def run():
+            HW5.get_xlogp_batch(cids, max_workers=args.workers)
+
+        yield Workload(run, len(cids), 'CIDs/s', request_latencies(transport))
+
+
+'''
+SAR
+'''
+
+
+@workload("sar_fit")
+def sar_fit(args):
+    HW5 = import_hw5()
+    from sklearn.model_selection import train_test_split
+    data = descriptor_table(args.sar_rows, args.descriptors)
+    X_train, X_test, y_train, y_test = train_test_split(data.drop(columns=['Target']), data['Target'],
+                                                        random_state=42)
+
+    def run():
+        HW5.fit_ElasticNet(X_train, X_test, y_train, y_test, k_values=(5, 10, 20))
+
+    yield Workload(run, len(data), 'rows/s', repeats=min(args.repeats, 3))
+
+
+@workload("sar_predict")
+def sar_predict(args):
+    HW5 = import_hw5()
+    indices = np.arange(20)
+    model = HW5.sar_model_train(descriptor_table(args.sar_rows, args.descriptors), indices)
+    data = descriptor_table(args.predict_rows, args.descriptors, mode='pred', seed=1)
+
+    def run():
+        HW5.sar_model_predict_batch(model, data, indices, chunk_size=10000)
+
+    yield Workload(run, len(data), 'rows/s')
+
+
+'''
+CARS
+'''
+
+
+@workload("car_simulation")
+def car_simulation(args):
+    from HW3 import Car
+    rng = np.random.default_rng(0)
+    max_speeds = rng.integers(100, 250, args.cars).tolist()
+    # (car, action, border): 0 accelerate, 1 brake, 2 parking; borders of None are single steps
+    cars = rng.integers(0, args.cars, args.operations).tolist()
+    actions = rng.choice(3, args.operations, p=[0.45, 0.45, 0.1]).tolist()
+    borders = [None if border < 0 else int(border) for border in rng.integers(-100, 250, args.operations)]
+
+    def run():
+        fleet = [Car(max_speed, verbose=False) for max_speed in max_speeds]
+        for car, action, border in zip(cars, actions, borders):
+            if action == 0:
+                fleet[car].accelerate(border)
+            elif action == 1:
+                fleet[car].brake(border)
+            else:
+                fleet[car].parking()
+        for car in fleet:
+            car.parking()
+
+    yield Workload(run, args.operations, 'operations/s')
+
+
+@workload("speed_iterators")
+def speed_iterators(args):
+    from HW3 import DecreaseSpeed, IncreaseSpeed
+    max_speeds = np.random.default_rng(0).integers(100, 250, args.cars).tolist()
+    steps = sum(-(-max_speed // 10) for max_speed in max_speeds) * 2
+
+    def run():
+        for max_speed in max_speeds:
+            for _ in IncreaseSpeed(0, max_speed):
+                pass
+            for _ in DecreaseSpeed(max_speed):
+                pass
+
+    yield Workload(run, steps, 'steps/s')
+
+
+@workload("fleet")
+def fleet(args):
+    from fleet import Fleet
+    rng = np.random.default_rng(0)
+    max_speeds = rng.integers(100, 250, args.fleet_size)
+    upper = rng.integers(0, 250, args.fleet_size)
+    lower = rng.integers(0, 100, args.fleet_size)
+    rounds = 10
+
+    def run():
+        cars = Fleet(max_speeds)
+        for _ in range(rounds):
+            cars.accelerate(upper)
+            cars.brake(lower)
+            cars.accelerate()
+            cars.brake()
+        cars.parking()
+
+    yield Workload(run, args.fleet_size * rounds * 4, 'car updates/s')
+
+
+'''
+HARNESS
+'''
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+def measure(bench, repeats, memory=True):
+    bench.run()  # warm-up: caches, imports, connection pools
+    times = []
+    for _ in range(bench.repeats or repeats):
+        start = time.perf_counter()
+        bench.run()
+        times.append(time.perf_counter() - start)
+    result = {"unit": bench.unit,
+              "items": bench.items,
+              "runs": len(times),
+              "throughput": bench.items / float(np.median(times)),
+              "latency_p50": percentile(times, 50),
+              "latency_p95": percentile(times, 95),
+              "latency_p99": percentile(times, 99)}
+    if bench.details is not None:
+        result.update(bench.details())
+    if memory:
+        tracemalloc.start()
+        try:
+            bench.run()
+            result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Returns {name: list of regressions} for the workloads present in both
+    '''
+    regressions = {}
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        problems = []
+        if result["throughput"] < old["throughput"] * (1 - tolerance):
+            problems.append(f"throughput {result['throughput']:.4g} < {old['throughput']:.4g} {result['unit']}")
+        if "peak_memory_mb" in result and "peak_memory_mb" in old \
+                and result["peak_memory_mb"] > old["peak_memory_mb"] * (1 + tolerance):
+            problems.append(f"peak memory {result['peak_memory_mb']:.1f} > {old['peak_memory_mb']:.1f} MB")
+        if problems:
+            regressions[name] = problems
+    return regressions
+
+
+def machine():
+    return {"python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the homework hot paths")
+    parser.add_argument('workloads', nargs='*', help=f"workloads to run, all by default: {', '.join(WORKLOADS)}")
+    parser.add_argument('--repeats', type=int, default=5, help="timed runs per workload")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run")
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARKS, 'data'), help="where generated fasta files are kept")
+    parser.add_argument('--fasta-mb', type=int, default=16, help="size of the synthetic fasta files")
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--ids', type=int, default=2000, help="IDs per lookup run")
+    parser.add_argument('--compounds', type=int, default=200, help="SMILES per similarity run")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent requests")
+    parser.add_argument('--latency', type=float, default=0.02, help="stub response delay, seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random extra stub delay, seconds")
+    parser.add_argument('--sar-rows', type=int, default=500)
+    parser.add_argument('--predict-rows', type=int, default=100000)
+    parser.add_argument('--descriptors', type=int, default=60)
+    parser.add_argument('--cars', type=int, default=10000)
+    parser.add_argument('--operations', type=int, default=200000)
+    parser.add_argument('--fleet-size', type=int, default=1000000)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.3, help="allowed relative change before a regression")
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help="write the results as JSON")
+    args = parser.parse_args()
+
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.workloads or WORKLOADS:
+        try:
+            with WORKLOADS[name](args) as bench:
+                results[name] = measure(bench, args.repeats, not args.no_memory)
+        except Skip as reason:
+            print(f"{name:26} skipped: {reason}")
+            continue
+        result = results[name]
+        memory = f"{result['peak_memory_mb']:9.1f} MB" if "peak_memory_mb" in result else ""
+        print(f"{name:26} {result['throughput']:12.4g} {result['unit']:14} "
+              f"p50 {result['latency_p50']:.4f}s  p95 {result['latency_p95']:.4f}s {memory}")
+
+    report = {"machine": machine(), "results": results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.update_baseline:
+        try:
+            with open(args.baseline) as file:
+                stored = json.load(file)
+        except FileNotFoundError:
+            stored = {"results": {}}
+        stored["machine"] = report["machine"]
+        stored["results"].update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump(stored, file, indent=2)
+        print(f"baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline, run with --update-baseline to store one")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get("machine") != report["machine"]:
+        print("note: the baseline was recorded on another machine or Python")
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for name, problems in regressions.items():
+        print(f"REGRESSION {name}: {'; '.join(problems)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
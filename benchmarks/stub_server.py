@@ -0,0 +1,182 @@
+'''
+Local HTTP stub replaying recorded responses of the remote services (UniProt, Ensembl, PubChem, ...).
+
+A response file is a JSON list of entries
+  {"host": "rest.uniprot.org", "method": "GET", "path": "/uniprotkb/accessions",
+   "status": 200, "headers": {...}, "body": <JSON> or "body_base64": "<bytes>"}
+matched by host, method and the longest path prefix. record() fetches live URLs into such a file,
+responses.json next to this module holds sample responses in the shape of the real APIs.
+
+redirect() mounts an adapter on a requests.Session (e.g. a Transport) that sends every request for the
+recorded hosts to the stub instead, so fetchers run unchanged against it.
+'''
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ORIGINAL_HOST_HEADER = "X-Stub-Host"
+
+
+def load_responses(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def record(urls, path, method="GET", session=None, data=None, headers=None):
+    '''
+    Fetches every URL once and appends the responses to the file at path
+    '''
+    session = session or requests.Session()
+    try:
+        responses = load_responses(path)
+    except FileNotFoundError:
+        responses = []
+    for url in urls:
+        response = session.request(method, url, data=data, headers=headers)
+        parts = urlsplit(url)
+        responses.append({"host": parts.hostname,
+                          "method": method,
+                          "path": parts.path,
+                          "status": response.status_code,
+                          "headers": {"Content-Type": response.headers.get("Content-Type", "application/octet-stream")},
+                          "body_base64": base64.b64encode(response.content).decode()})
+    with open(path, 'w') as file:
+        json.dump(responses, file, indent=1)
+
+
+class StubServer:
+    '''
+    Threaded HTTP/1.1 server on 127.0.0.1 answering from recorded responses.
+
+    Constructor params:
+      responses: list of entries (see the module docstring) or a path to a response file
+      latency: delay added to every response, seconds
+      jitter: random extra delay, uniform in [0, jitter] seconds
+    '''
+
+    def __init__(self, responses, latency=0.0, jitter=0.0, seed=0):
+        if isinstance(responses, str):
+            responses = load_responses(path=responses)
+        self.routes = {}
+        for entry in responses:
+            if "body_base64" in entry:
+                body = base64.b64decode(entry["body_base64"])
+            else:
+                body = json.dumps(entry["body"]).encode()
+            headers = entry.get("headers", {"Content-Type": "application/json"})
+            key = (entry["host"], entry.get("method", "GET").upper())
+            self.routes.setdefault(key, []).append((entry["path"], entry.get("status", 200), headers, body))
+        for routes in self.routes.values():
+            routes.sort(key=lambda route: -len(route[0]))
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def hosts(self):
+        return sorted({host for host, _ in self.routes})
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def match(self, host, method, path):
+        for prefix, status, headers, body in self.routes.get((host, method), []):
+            if path.startswith(prefix):
+                return status, headers, body
+        return 404, {"Content-Type": "application/json"}, b'{"error": "no recorded response"}'
+
+    def delay(self):
+        with self._lock:
+            self.requests += 1
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0
+        return self.latency + extra
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def answer(self):
+                length = int(self.headers.get("Content-Length", 0))
+                if length:
+                    self.rfile.read(length)
+                host = self.headers.get(ORIGINAL_HOST_HEADER, "")
+                status, headers, body = stub.match(host, self.command, urlsplit(self.path).path)
+                wait = stub.delay()
+                if wait:
+                    time.sleep(wait)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = answer
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubAdapter(HTTPAdapter):
+    '''
+    Sends requests to the stub server, keeping path and query; the original host goes in a header
+    '''
+
+    def __init__(self, stub_url, **kwargs):
+        super().__init__(**kwargs)
+        self.stub = urlsplit(stub_url)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.headers[ORIGINAL_HOST_HEADER] = parts.hostname
+        request.url = urlunsplit((self.stub.scheme, self.stub.netloc, parts.path, parts.query, ''))
+        return super().send(request, **kwargs)
+
+
+def redirect(session, server, hosts=None):
+    '''
+    Routes the session's requests for hosts (all recorded hosts by default) to the stub server.
+    A Transport's rate limits are switched off for them, the benchmarks measure the client, not the limiter.
+    '''
+    adapter = StubAdapter(server.url, pool_connections=20, pool_maxsize=20)
+    for host in hosts or server.hosts:
+        session.mount(f"https://{host}", adapter)
+        session.mount(f"http://{host}", adapter)
+    if hasattr(session, "rate_limits"):
+        session.rate_limits = {}
+        session.buckets.clear()
+    return session
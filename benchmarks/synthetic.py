@@ -0,0 +1,126 @@
+'''
+Synthetic inputs for the benchmarks, reproducible from a seed.
+
+  write_fasta: DNA (Ensembl-style IDs) or protein (UniProt-style IDs) fasta of a given size, written in blocks
+  fasta_ids: the IDs write_fasta puts in the headers
+  smiles: simple valid SMILES (chains with branches, rings and heteroatoms)
+  descriptor_table: descriptor matrix shaped like desc_calc output, with a Target (train) or SMILES column
+'''
+import os
+
+import numpy as np
+import pandas as pd
+
+DNA_ALPHABET = np.frombuffer(b'ACGT', dtype=np.uint8)
+PROTEIN_ALPHABET = np.frombuffer(b'ACDEFGHIKLMNPQRSTVWY', dtype=np.uint8)
+ALPHANUMERIC = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def fasta_ids(kind, count, start=0):
+    '''
+    IDs matched by id_extraction.ID_REGEX, derived from the record number: ENSG + 11 digits for DNA,
+    10-character UniProt accessions (A0 + two letter/alnum/alnum/digit groups) for Protein
+    '''
+    if kind == 'DNA':
+        return [f"ENSG{number:011d}" for number in range(start + 1, start + count + 1)]
+    ids = []
+    for number in range(start, start + count):
+        groups = []
+        for _ in range(2):
+            number, digit = divmod(number, 10)
+            number, second = divmod(number, 36)
+            number, first = divmod(number, 36)
+            number, letter = divmod(number, 26)
+            groups.append(f"{ALPHANUMERIC[10 + letter]}{ALPHANUMERIC[first]}{ALPHANUMERIC[second]}{digit}")
+        ids.append("A0" + ''.join(groups))
+    return ids
+
+
+def write_fasta(path, kind='DNA', size_mb=16, mean_length=None, line_width=60, seed=0):
+    '''
+    Writes a fasta file of about size_mb megabytes and returns the number of records.
+    Record lengths are drawn around mean_length (1500 bp for DNA, 400 aa for Protein);
+    sequences are generated a block of records at a time, so gigabyte files need little memory.
+    '''
+    rng = np.random.default_rng(seed)
+    alphabet = DNA_ALPHABET if kind == 'DNA' else PROTEIN_ALPHABET
+    mean_length = mean_length or (1500 if kind == 'DNA' else 400)
+    target = int(size_mb * 2 ** 20)
+    written = 0
+    records = 0
+    block = 1000
+    with open(path, 'wb') as fasta:
+        while written < target:
+            lengths = np.maximum(rng.poisson(mean_length, block), 1)
+            letters = alphabet[rng.integers(0, len(alphabet), lengths.sum())]
+            ids = fasta_ids(kind, block, records)
+            chunks = []
+            offset = 0
+            for seq_id, length in zip(ids, lengths):
+                sequence = letters[offset:offset + length].tobytes()
+                offset += length
+                if kind == 'DNA':
+                    header = f">{seq_id}.1 synthetic gene\n"
+                else:
+                    header = f">sp|{seq_id}|SYN{records % 100000}_HUMAN Synthetic protein OS=Homo sapiens\n"
+                lines = [sequence[start:start + line_width] for start in range(0, length, line_width)]
+                chunks.append(header.encode() + b'\n'.join(lines) + b'\n')
+                records += 1
+                written += len(chunks[-1])
+                if written >= target:
+                    break
+            fasta.write(b''.join(chunks))
+    return records
+
+
+def cached_fasta(directory, kind, size_mb, seed=0):
+    '''
+    Path of a synthetic fasta in directory, generated on the first request
+    '''
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{kind.lower()}_{size_mb}mb_{seed}.fasta")
+    if not os.path.exists(path):
+        write_fasta(path + ".part", kind, size_mb, seed=seed)
+        os.replace(path + ".part", path)
+    return path
+
+
+def smiles(count, seed=0):
+    '''
+    Valid SMILES: a chain of C/N/O/S atoms, carbons carrying at most one substituent, sometimes ending in a phenyl
+    '''
+    rng = np.random.default_rng(seed)
+    atoms = ['C', 'C', 'C', 'N', 'O', 'S']
+    branches = ['(C)', '(O)', '(N)', '(F)', '(Cl)', '(=O)']
+    result = []
+    for _ in range(count):
+        parts = ['C']
+        for _ in range(rng.integers(2, 12)):
+            atom = atoms[rng.integers(len(atoms))]
+            parts.append(atom)
+            if atom == 'C' and rng.random() < 0.4:
+                parts.append(branches[rng.integers(len(branches))])
+        if rng.random() < 0.3:
+            parts.append('c1ccccc1')
+        result.append(''.join(parts))
+    return result
+
+
+def descriptor_table(count, n_descriptors=60, mode='train', informative=10, missing=0.01, seed=0):
+    '''
+    Descriptor matrix with columns descriptor_0..N like desc_calc output. In train mode Target is a noisy
+    linear function of the first informative descriptors; otherwise a SMILES column is added.
+    About `missing` of the values are NaN, so the imputer has work to do.
+    '''
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(count, n_descriptors))
+    table = pd.DataFrame(values, columns=[f"descriptor_{i}" for i in range(n_descriptors)])
+    if mode == 'train':
+        weights = rng.normal(size=informative)
+        table['Target'] = values[:, :informative] @ weights + rng.normal(scale=0.1, size=count)
+    else:
+        table['SMILES'] = smiles(count, seed)
+    if missing:
+        mask = rng.random((count, n_descriptors)) < missing
+        table.iloc[:, :n_descriptors] = table.iloc[:, :n_descriptors].mask(mask)
+    return table
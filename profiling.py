@@ -0,0 +1,217 @@
+'''
+Per-stage timing for the homework pipelines (BioPythonLib, the SAR and PubChem parts of HW5).
+
+Stages are marked with spans, as a context manager or a decorator, and amounts (records, requests, bytes)
+with counters:
+
+    with profiler.span("fasta.parse", file=name):
+        ...
+
+    @profiler.timed("desc_calc")
+    def desc_calc(...): ...
+
+    profiler.count("fasta.records", n)
+
+Nothing is recorded until the profiler is enabled, either with profiler.enable() or by setting
+HW_PROFILE=<report path> (HW_PROFILE_STAGES / HW_MEMORY_STAGES: comma-separated stages to run under
+cProfile / tracemalloc). A disabled span is one shared no-op object, a disabled count() returns at once.
+The report is JSON (write_json) or the Chrome trace format (write_chrome_trace), the latter opens in
+chrome://tracing or Perfetto. With HW_PROFILE the report is written at exit, as a Chrome trace when
+the path ends with .trace.json.
+'''
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+_NULL_SPAN = nullcontext()
+
+
+class Span:
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self._profile = None
+        self._tracing = False
+
+    def __enter__(self):
+        profiler = self.profiler
+        if self.name in profiler.profile_stages:
+            self._profile = profiler._start_profile()
+        if self.name in profiler.memory_stages:
+            self._tracing = profiler._start_memory()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        profiler = self.profiler
+        if self._profile is not None:
+            profiler._stop_profile(self.name, self._profile)
+        if self._tracing:
+            profiler._stop_memory(self.name)
+        profiler._record(self.name, self.start, end - self.start, self.args)
+        return False
+
+
+class Profiler:
+    '''
+    Collects spans, counters and optional cProfile / tracemalloc results for chosen stages.
+
+    Methods:
+      enable / disable: switch recording on and off; enable also chooses the stages to profile
+      span: context manager timing one stage, keyword arguments are stored with it
+      timed: decorator, every call of the function is a span
+      count: adds a value to a named counter
+      report: aggregated spans (calls, total, min, max in seconds), counters, profiles and memory
+      write_json / write_chrome_trace: exports the report / the raw spans
+      reset: drops everything recorded so far
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.profile_stages = frozenset()
+        self.memory_stages = frozenset()
+        self._lock = threading.Lock()
+        self._profile_active = False
+        self.reset()
+
+    def enable(self, profile_stages=(), memory_stages=()):
+        self.profile_stages = frozenset(profile_stages)
+        self.memory_stages = frozenset(memory_stages)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.events = []  # (name, start ns, duration ns, thread id, args)
+            self.counters = {}
+            self.profiles = {}
+            self.memory = {}
+            self.origin = time.perf_counter_ns()
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, args)
+
+    def timed(self, name=None):
+        def decorator(function):
+            stage = name or function.__qualname__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Span(self, stage, {}):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _record(self, name, start, duration, args):
+        with self._lock:
+            self.events.append((name, start, duration, threading.get_ident(), args))
+
+    def _start_profile(self):
+        # only one cProfile can run at a time; a nested or concurrent stage is timed but not profiled
+        with self._lock:
+            if self._profile_active:
+                return None
+            self._profile_active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def _stop_profile(self, name, profile, limit=30):
+        profile.disable()
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(limit)
+        with self._lock:
+            self._profile_active = False
+            self.profiles[name] = text.getvalue()
+
+    def _start_memory(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            return False
+        tracemalloc.start()
+        return True
+
+    def _stop_memory(self, name, limit=10):
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics('lineno')[:limit]
+        tracemalloc.stop()
+        with self._lock:
+            self.memory[name] = {"current_bytes": current,
+                                 "peak_bytes": peak,
+                                 "top": [str(stat) for stat in top]}
+
+    def report(self):
+        spans = {}
+        with self._lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+            profiles = dict(self.profiles)
+            memory = dict(self.memory)
+        for name, _, duration, _, _ in events:
+            seconds = duration / 1e9
+            stats = spans.setdefault(name, {"calls": 0, "total": 0.0, "min": seconds, "max": seconds})
+            stats["calls"] += 1
+            stats["total"] += seconds
+            stats["min"] = min(stats["min"], seconds)
+            stats["max"] = max(stats["max"], seconds)
+        return {"spans": spans, "counters": counters, "profiles": profiles, "memory": memory}
+
+    def write_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=2, default=str)
+
+    def write_chrome_trace(self, path):
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+        trace = [{"name": name, "ph": "X", "pid": pid, "tid": tid,
+                  "ts": (start - self.origin) / 1000, "dur": duration / 1000,
+                  "args": {key: str(value) for key, value in args.items()}}
+                 for name, start, duration, tid, args in events]
+        end = max((start + duration - self.origin for _, start, duration, _, _ in events), default=0) / 1000
+        trace += [{"name": name, "ph": "C", "pid": pid, "ts": end, "args": {name: value}}
+                  for name, value in counters.items()]
+        with open(path, 'w') as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file, default=str)
+
+
+profiler = Profiler()
+
+
+def _stages(variable):
+    return [stage.strip() for stage in os.environ.get(variable, "").split(",") if stage.strip()]
+
+
+def _write_at_exit(path):
+    if path.endswith('.trace.json'):
+        profiler.write_chrome_trace(path)
+    else:
+        profiler.write_json(path)
+
+
+if os.environ.get("HW_PROFILE"):
+    profiler.enable(_stages("HW_PROFILE_STAGES"), _stages("HW_MEMORY_STAGES"))
+    atexit.register(_write_at_exit, os.environ["HW_PROFILE"])
@@ -0,0 +1,187 @@
+'''
+Shared HTTP transport for the homework scripts that call remote services
+(UniProt, Ensembl, PubChem, Open-Meteo).
+
+Transport is a requests.Session, so it can be passed anywhere a session is accepted. On top of
+connection pooling it adds a per-request timeout, per-host token-bucket rate limiting, retries with
+exponential backoff and jitter (honouring Retry-After), and per-host latency/error metrics.
+'''
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from profiling import profiler
+
+# Requests per second and burst size, from the services' usage policies
+HOST_RATE_LIMITS = {"rest.uniprot.org": (10, 10),
+                    "rest.ensembl.org": (15, 15),
+                    "pubchem.ncbi.nlm.nih.gov": (5, 5),
+                    "api.open-meteo.com": (10, 10)}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket: acquire() blocks until a token is available
+    '''
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostMetrics:
+    def __init__(self, samples=10000):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latencies = deque(maxlen=samples)
+        self.lock = threading.Lock()  # one Transport is shared by the fetcher thread pools
+
+    def add(self, requests=0, errors=0, retries=0, latency=None):
+        with self.lock:
+            self.requests += requests
+            self.errors += errors
+            self.retries += retries
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def summary(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            requests, errors, retries = self.requests, self.errors, self.retries
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+        return {"requests": requests,
+                "errors": errors,
+                "retries": retries,
+                "latency_mean": sum(latencies) / len(latencies) if latencies else None,
+                "latency_p50": percentile(0.5),
+                "latency_p95": percentile(0.95),
+                "latency_max": latencies[-1] if latencies else None}
+
+
+class Transport(requests.Session):
+    '''
+    Constructor params:
+      rate_limits: {host: (requests per second, burst)}, HOST_RATE_LIMITS by default
+      default_rate: (requests per second, burst) for other hosts, None for no limit
+      retries: how many times a failed request is repeated
+      backoff: base delay in seconds, doubled on every retry (with full jitter) up to max_backoff
+      timeout: default (connect, read) timeout in seconds
+      pool_size: connections kept per host
+    '''
+
+    def __init__(self, rate_limits=None, default_rate=None, retries=5, backoff=0.5, max_backoff=30,
+                 timeout=(5, 60), pool_size=10):
+        super().__init__()
+        self.rate_limits = HOST_RATE_LIMITS if rate_limits is None else rate_limits
+        self.default_rate = default_rate
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.buckets = {}
+        self.metrics = defaultdict(HostMetrics)
+        self._lock = threading.Lock()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self.buckets:
+                limit = self.rate_limits.get(host, self.default_rate)
+                self.buckets[host] = TokenBucket(*limit) if limit else None
+            return self.buckets[host]
+
+    def delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "").strip()
+            if retry_after.isdigit():
+                return min(self.max_backoff, int(retry_after))
+            if retry_after:
+                # the other allowed form is an HTTP-date
+                try:
+                    wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    wait = None
+                if wait is not None:
+                    return min(self.max_backoff, max(0.0, wait))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).hostname
+        bucket = self.bucket(host)
+        with self._lock:
+            metrics = self.metrics[host]
+        for attempt in range(self.retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            start = time.perf_counter()
+            metrics.add(requests=1)
+            profiler.count("http.requests")
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.add(errors=1)
+                if attempt == self.retries:
+                    raise
+                wait = self.delay(attempt)
+            else:
+                metrics.add(latency=time.perf_counter() - start)
+                if profiler.enabled and not kwargs.get("stream"):
+                    profiler.count("http.bytes", len(response.content))
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                metrics.add(errors=1)
+                if attempt == self.retries:
+                    return response
+                wait = self.delay(attempt, response)
+            metrics.add(retries=1)
+            time.sleep(wait)
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        return {host: host_metrics.summary() for host, host_metrics in metrics.items()}
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def default_transport():
+    '''
+    Process-wide Transport shared by all fetchers
+    '''
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport